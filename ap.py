@@ -9,7 +9,8 @@ file_to_update = "daily.txt"
 with open(file_to_update, "a") as f:
     f.write(f"Commit made on: {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
 
-# Git commands to add, commit, and push
+# Git commands to add, commit, and push. Each runs directly, without a shell, and
+# the first failure stops the rest
 commands = [
     ["git", "add", file_to_update],
     ["git", "commit", "-m", f"Daily commit: {datetime.now().strftime('%Y-%m-%d')}"],
@@ -17,9 +18,9 @@ commands = [
 ]
 
 # Execute commands
-for command in commands:
-    result = subprocess.run(command, capture_output=True, text=True)
-    if result.returncode != 0:
-        print(f"Error running command: {' '.join(command)}")
-        print(result.stderr)
-        break
+try:
+    for command in commands:
+        subprocess.run(command, check=True, capture_output=True, text=True)
+except subprocess.CalledProcessError as e:
+    print(f"Error running command: {' '.join(e.cmd)}")
+    print(e.stderr)
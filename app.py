@@ -4,24 +4,73 @@ import os
 from werkzeug.utils import secure_filename
 from datetime import datetime
 import uuid
+import logging.config
+from concurrent.futures import ThreadPoolExecutor
+from jinja2 import FileSystemBytecodeCache
 
 # Import configuration
 from config import Config
 
+# Import shared extensions
+from extensions import cache
+
 # Import route modules
 from routes.main import main_bp
 from routes.diagnosis import diagnosis_bp
 from routes.education import education_bp
 
+# Import the model loader
+from models.model import load_model
+
+# Configure logging once for the whole application
+logging.config.dictConfig({
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'default': {'format': '%(asctime)s %(levelname)s %(name)s: %(message)s'}
+    },
+    'handlers': {
+        'console': {'class': 'logging.StreamHandler', 'formatter': 'default'}
+    },
+    'root': {'level': 'INFO', 'handlers': ['console']}
+})
+
 # Initialize Flask app
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Keep the file-system cache in a directory only this user can read; its entries are pickles
+if not app.config['CACHE_DIR']:
+    app.config['CACHE_DIR'] = os.path.join(app.instance_path, 'cache')
+os.makedirs(app.config['CACHE_DIR'], mode=0o700, exist_ok=True)
+cache.init_app(app)
+
+# Share compiled templates between processes and restarts. With no directory given,
+# Jinja uses a per-user 0700 directory and refuses one owned by anyone else
+app.jinja_env.bytecode_cache = FileSystemBytecodeCache()
+
 # Register blueprints
 app.register_blueprint(main_bp)
 app.register_blueprint(diagnosis_bp, url_prefix='/diagnose')
 app.register_blueprint(education_bp, url_prefix='/education')
 
+# Load the model once at startup so no request pays the cold-load cost
+with app.app_context():
+    app.extensions['skin_model'] = load_model()
+
+# Run preprocessing + prediction off the request threads; enough workers to fill a model
+# batch. OpenCV releases the GIL while decoding and resizing, so uploads preprocess in parallel
+app.extensions['inference_pool'] = ThreadPoolExecutor(
+    max_workers=app.config['INFERENCE_WORKERS'],
+    thread_name_prefix='inference'
+)
+
+# Send contact emails off the request threads, retrying SMTP failures there
+app.extensions['email_pool'] = ThreadPoolExecutor(
+    max_workers=app.config['EMAIL_WORKERS'],
+    thread_name_prefix='email'
+)
+
 # Ensure upload directory exists
 os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
 
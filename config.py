@@ -19,6 +19,28 @@ class Config:
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max upload size
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg'}
     
+    # Background threads running preprocessing + prediction, and how many
+    # uploads may be queued or running before the API answers 503
+    INFERENCE_WORKERS = int(os.getenv('INFERENCE_WORKERS', 16))
+    INFERENCE_QUEUE_SIZE = int(os.getenv('INFERENCE_QUEUE_SIZE', 64))
+    
+    # Threads for the TFLite interpreter (0 = all CPUs). gunicorn.conf.py sets this to 1
+    # in a preloading master, whose interpreter is replaced in every forked worker
+    TFLITE_NUM_THREADS = int(os.getenv('TFLITE_NUM_THREADS', 0))
+    
+    # Compile the Keras forward pass with XLA (falls back to the plain graph if it fails)
+    MODEL_JIT_COMPILE = os.getenv('MODEL_JIT_COMPILE', 'True').lower() in ('true', '1', 't')
+    
+    # App cache (Flask-Caching) for rendered pages, diagnosis results, API jobs and Groq
+    # analyses. It must be shared by every worker process: the default file-system cache
+    # is, on one host (CACHE_DIR defaults to a private directory under the instance
+    # folder); use RedisCache across hosts. SimpleCache is per-process and is refused
+    # by gunicorn.conf.py when more than one worker is configured
+    CACHE_TYPE = os.getenv('CACHE_TYPE', 'FileSystemCache')
+    CACHE_DIR = os.getenv('CACHE_DIR')
+    CACHE_THRESHOLD = int(os.getenv('CACHE_THRESHOLD', 10000))
+    CACHE_DEFAULT_TIMEOUT = int(os.getenv('CACHE_DEFAULT_TIMEOUT', 3600))
+    
     # Email settings for contact form
     MAIL_SERVER = os.getenv('MAIL_SERVER', 'smtp.gmail.com')
     MAIL_PORT = int(os.getenv('MAIL_PORT', 587))
@@ -28,6 +50,9 @@ class Config:
     MAIL_DEFAULT_SENDER = os.getenv('MAIL_DEFAULT_SENDER', 'noreply@skindetection.com')
     CONTACT_EMAIL = os.getenv('CONTACT_EMAIL', 'contact@skindetection.com')
     
+    # Background threads delivering contact emails
+    EMAIL_WORKERS = int(os.getenv('EMAIL_WORKERS', 2))
+    
     # Groq API settings
     GROQ_API_KEY = os.getenv('GROQ_API_KEY', '')
     GROQ_MODEL = os.getenv('GROQ_MODEL', 'llama2-70b-4096')
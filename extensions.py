@@ -0,0 +1,18 @@
+# extensions.py
+import hashlib
+from flask import session, request
+from flask_caching import Cache
+
+# Shared response cache, bound to the app in app.py
+cache = Cache()
+
+def has_pending_flashes():
+    """Return True if the session holds flash messages, whose page must not be cached or served from cache."""
+    return '_flashes' in session
+
+def add_etag(response):
+    """after_request hook: tag rendered pages with a content hash and answer matching conditional GETs with 304."""
+    if request.method == 'GET' and response.status_code == 200 and not response.direct_passthrough:
+        response.set_etag(hashlib.blake2b(response.get_data(), digest_size=16).hexdigest())
+        response.make_conditional(request)
+    return response
@@ -0,0 +1,36 @@
+# gunicorn.conf.py
+import os
+import multiprocessing
+
+bind = f"{os.getenv('HOST', '0.0.0.0')}:{os.getenv('PORT', 5000)}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+
+# Diagnosis results, API jobs and Groq analyses are handed between workers through
+# the app cache, so a per-process cache would lose them across requests
+from config import Config
+if workers > 1 and Config.CACHE_TYPE in ('SimpleCache', 'simple', 'NullCache', 'null'):
+    raise RuntimeError(f"CACHE_TYPE={Config.CACHE_TYPE} is per-process; use FileSystemCache or RedisCache with {workers} workers")
+
+# Load the app, and with it the model, once in the master so workers share the
+# weights copy-on-write. Only done for the TFLite model: its file is memory-mapped,
+# whereas the TensorFlow runtime behind the Keras fallback is not fork-safe.
+preload_app = os.path.exists(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'models', 'model.tflite'))
+
+# The master's interpreter must not start an XNNPACK thread pool: its threads do not
+# exist in the forked workers, so tearing the pool down there in post_fork can hang
+# or crash. A single-threaded interpreter has no pool; workers reopen their own.
+if preload_app:
+    os.environ['TFLITE_NUM_THREADS'] = '1'
+
+def post_fork(server, worker):
+    """Give each worker its own interpreter over the shared model file."""
+    if not preload_app:
+        return
+    
+    from app import app
+    from models.model import reopen_tflite_model
+    
+    # Split the CPUs between workers instead of oversubscribing them
+    num_threads = max(1, multiprocessing.cpu_count() // workers)
+    app.extensions['skin_model'] = reopen_tflite_model(num_threads)
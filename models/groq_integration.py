@@ -1,14 +1,88 @@
 # models/groq_integration.py
 import os
 import json
+import orjson
+import time
+import queue
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 from flask import current_app
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Shared HTTP session so the TLS connection to Groq is reused across requests.
+# POSTs are retried too since a repeated analysis request has no side effects.
+_session = requests.Session()
+_adapter = HTTPAdapter(
+    pool_connections=10,
+    pool_maxsize=50,
+    max_retries=Retry(
+        total=2,
+        backoff_factor=0.3,
+        status_forcelist=[429, 500, 502, 503, 504],
+        allowed_methods=None,
+        raise_on_status=False
+    )
+)
+_session.mount('https://', _adapter)
+_session.headers.update({"Content-Type": "application/json"})
+
+# Background workers so Groq calls stay off the request thread
+_groq_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='groq')
+
+# Queued analysis requests are grouped into a single Groq call per batch
+BATCH_MAX_SIZE = 8
+BATCH_MAX_WAIT = 0.05  # seconds
+_pending = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+
+GROQ_API_URL = "https://api.groq.com/openai/v1/chat/completions"
+GROQ_TIMEOUT = 30  # seconds, for the whole request including the response body
+
+_json_decoder = json.JSONDecoder()
+
+# Keys every analysis object is expected to contain
+ANALYSIS_FORMAT = """
+        - description
+        - key_characteristics (as an array)
+        - urgency_level (string: "High", "Medium", or "Low")
+        - requires_urgent_attention (boolean)
+        - urgency_explanation
+        - followup_questions (as an array)"""
+
+# Analysis cache settings; answers are near-deterministic at low temperature
+ANALYSIS_CACHE_SIZE = 256
+ANALYSIS_CACHE_TTL = 3600  # seconds
+
+# LRU cache of (timestamp, analysis) pairs keyed by (predicted_class, rounded confidence)
+_analysis_cache = OrderedDict()
+_analysis_cache_lock = threading.Lock()
+
+def _get_cached_analysis(key):
+    """Return the cached analysis for a key, or None if missing or expired."""
+    with _analysis_cache_lock:
+        entry = _analysis_cache.pop(key, None)
+        if entry is None or time.monotonic() - entry[0] > ANALYSIS_CACHE_TTL:
+            return None
+        _analysis_cache[key] = entry
+        return entry[1]
+
+def _cache_analysis(key, analysis):
+    """Cache a successful analysis, evicting the least recently used entries."""
+    if not analysis or 'error' in analysis:
+        return
+    with _analysis_cache_lock:
+        _analysis_cache.pop(key, None)
+        _analysis_cache[key] = (time.monotonic(), analysis)
+        while len(_analysis_cache) > ANALYSIS_CACHE_SIZE:
+            _analysis_cache.popitem(last=False)
+
 def get_groq_analysis(predicted_class, confidence):
     """
     Get additional analysis from Groq LLM API for the predicted skin condition.
@@ -20,14 +94,170 @@ def get_groq_analysis(predicted_class, confidence):
     Returns:
         dict: Additional analysis information from Groq.
     """
+    # Get API key from config
+    api_key = current_app.config.get('GROQ_API_KEY', '')
+    model_name = current_app.config.get('GROQ_MODEL', 'llama2-70b-4096')
+    
+    if not api_key:
+        logger.warning("No Groq API key provided")
+        return None
+    
+    return _request_analysis(api_key, model_name, predicted_class, confidence)
+
+def submit_groq_analysis(predicted_class, confidence):
+    """
+    Start a Groq analysis in the background.
+    
+    Args:
+        predicted_class (str): The predicted skin condition class.
+        confidence (float): The confidence score of the prediction.
+        
+    Returns:
+        Future: Resolves to the analysis dict, or None if no API key is configured.
+    """
+    # Read config here; the worker threads have no application context
+    api_key = current_app.config.get('GROQ_API_KEY', '')
+    model_name = current_app.config.get('GROQ_MODEL', 'llama2-70b-4096')
+    
+    future = Future()
+    
+    if not api_key:
+        logger.warning("No Groq API key provided")
+        future.set_result(None)
+        return future
+    
+    # Answer straight from the cache without queueing
+    cached_analysis = _get_cached_analysis((predicted_class, round(confidence, 1)))
+    if cached_analysis is not None:
+        future.set_result(cached_analysis)
+        return future
+    
+    _ensure_batch_thread()
+    _pending.put((api_key, model_name, predicted_class, confidence, future))
+    return future
+
+def _ensure_batch_thread():
+    """Start the batching thread if it is not running in this process."""
+    global _batch_thread
+    with _batch_thread_lock:
+        if _batch_thread is None or not _batch_thread.is_alive():
+            _batch_thread = threading.Thread(target=_batch_worker, name='groq-batcher', daemon=True)
+            _batch_thread.start()
+
+def _batch_worker():
+    """Drain the request queue into batches and hand each batch to the pool."""
+    while True:
+        batch = [_pending.get()]
+        deadline = time.monotonic() + BATCH_MAX_WAIT
+        while len(batch) < BATCH_MAX_SIZE:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(_pending.get(timeout=remaining))
+            except queue.Empty:
+                break
+        
+        # Requests made with different credentials cannot share a call
+        groups = {}
+        for item in batch:
+            groups.setdefault(item[:2], []).append(item)
+        for group in groups.values():
+            _groq_pool.submit(_run_batch, group)
+
+def _run_batch(batch):
+    """Resolve the futures of a batch of queued analysis requests."""
+    api_key, model_name = batch[0][:2]
+    
     try:
-        # Get API key from config
-        api_key = current_app.config.get('GROQ_API_KEY', '')
-        model_name = current_app.config.get('GROQ_MODEL', 'llama2-70b-4096')
+        # Single-item fast path keeps the original one-analysis prompt
+        if len(batch) == 1:
+            _, _, predicted_class, confidence, future = batch[0]
+            future.set_result(_request_analysis(api_key, model_name, predicted_class, confidence))
+            return
+        
+        items = [(predicted_class, confidence) for _, _, predicted_class, confidence, _ in batch]
+        analyses = _request_batch_analysis(api_key, model_name, items)
+        for (_, _, predicted_class, confidence, future), analysis in zip(batch, analyses):
+            _cache_analysis((predicted_class, round(confidence, 1)), analysis)
+            future.set_result(analysis)
+    except Exception as e:
+        logger.error("Error in _run_batch: %s", e)
+        for item in batch:
+            if not item[4].done():
+                item[4].set_result({"error": str(e)})
+
+def _post_chat(api_key, model_name, prompt):
+    """
+    Send a chat completion request to Groq.
+    
+    Returns:
+        tuple: (content, error) where exactly one is None.
+    """
+    # Prepare the API request
+    headers = {
+        "Authorization": f"Bearer {api_key}"
+    }
+    
+    data = {
+        "model": model_name,
+        "messages": [
+            {"role": "system", "content": "You are a helpful dermatology assistant that provides information in JSON format."},
+            {"role": "user", "content": prompt}
+        ],
+        "temperature": 0.1,  # Low temperature for more consistent, factual responses
+        "max_tokens": 2048,
+        "response_format": {"type": "json_object"}
+    }
+    
+    # Make the API request, streaming the body so the whole call stays within budget
+    deadline = time.monotonic() + GROQ_TIMEOUT
+    with _session.post(
+        GROQ_API_URL,
+        headers=headers,
+        data=orjson.dumps(data),
+        timeout=GROQ_TIMEOUT,
+        stream=True
+    ) as response:
+        # Check if the request was successful
+        if response.status_code != 200:
+            logger.error("Groq API request failed with status code %s: %s", response.status_code, response.text)
+            return None, f"API request failed with status code {response.status_code}"
         
-        if not api_key:
-            logger.warning("No Groq API key provided")
+        body = bytearray()
+        for chunk in response.iter_content(chunk_size=16 * 1024):
+            body += chunk
+            if time.monotonic() > deadline:
+                logger.error("Groq API response exceeded the %ss budget", GROQ_TIMEOUT)
+                return None, "API request timed out"
+    
+    response_data = orjson.loads(body)
+    return response_data['choices'][0]['message']['content'], None
+
+def _parse_json_content(content):
+    """Parse the JSON object in a Groq response, or return None if there is none."""
+    try:
+        return orjson.loads(content)
+    except orjson.JSONDecodeError as e:
+        logger.error("Failed to parse JSON response from Groq: %s", e)
+        # If parsing fails, decode the first JSON object embedded in the text
+        # (orjson has no raw_decode, so this rare path uses the json module)
+        start_idx = content.find('{')
+        if start_idx < 0:
             return None
+        try:
+            return _json_decoder.raw_decode(content, start_idx)[0]
+        except json.JSONDecodeError:
+            return None
+
+def _request_analysis(api_key, model_name, predicted_class, confidence):
+    """Request the analysis of one prediction from the Groq API."""
+    try:
+        # Reuse a recent answer for the same class and confidence bucket
+        cache_key = (predicted_class, round(confidence, 1))
+        cached_analysis = _get_cached_analysis(cache_key)
+        if cached_analysis is not None:
+            return cached_analysis
         
         # Define the prompt
         prompt = f"""
@@ -39,68 +269,67 @@ def get_groq_analysis(predicted_class, confidence):
         3. Whether this condition generally requires urgent medical attention (Yes/No, with brief explanation)
         4. Two follow-up questions a doctor might ask the patient about this condition
         
-        Format your response as structured JSON with the following keys:
-        - description
-        - key_characteristics (as an array)
-        - urgency_level (string: "High", "Medium", or "Low")
-        - requires_urgent_attention (boolean)
-        - urgency_explanation
-        - followup_questions (as an array)
+        Format your response as structured JSON with the following keys:{ANALYSIS_FORMAT}
         
         Ensure your response is valid JSON format.
         """
         
-        # Prepare the API request
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        
-        data = {
-            "model": model_name,
-            "messages": [
-                {"role": "system", "content": "You are a helpful dermatology assistant that provides information in JSON format."},
-                {"role": "user", "content": prompt}
-            ],
-            "temperature": 0.1,  # Low temperature for more consistent, factual responses
-            "max_tokens": 2048,
-            "response_format": {"type": "json_object"}
-        }
+        content, error = _post_chat(api_key, model_name, prompt)
+        if error:
+            return {"error": error}
         
-        # Make the API request
-        response = requests.post(
-            "https://api.groq.com/openai/v1/chat/completions",
-            headers=headers,
-            json=data,
-            timeout=30
-        )
+        analysis = _parse_json_content(content)
+        if analysis is None:
+            return {"error": "Failed to parse JSON from Groq response"}
         
-        # Check if the request was successful
-        if response.status_code == 200:
-            response_data = response.json()
-            content = response_data['choices'][0]['message']['content']
-            
-            # Parse the JSON response
-            try:
-                analysis = json.loads(content)
-                return analysis
-            except json.JSONDecodeError as e:
-                logger.error(f"Failed to parse JSON response from Groq: {e}")
-                # If parsing fails, try to extract JSON using simple string operations
-                try:
-                    # Find the starting and ending curly braces
-                    start_idx = content.find('{')
-                    end_idx = content.rfind('}') + 1
-                    if start_idx >= 0 and end_idx > start_idx:
-                        json_str = content[start_idx:end_idx]
-                        analysis = json.loads(json_str)
-                        return analysis
-                except Exception:
-                    return {"error": "Failed to parse JSON from Groq response"}
-        else:
-            logger.error(f"Groq API request failed with status code {response.status_code}: {response.text}")
-            return {"error": f"API request failed with status code {response.status_code}"}
+        _cache_analysis(cache_key, analysis)
+        return analysis
             
     except Exception as e:
-        logger.error(f"Error in get_groq_analysis: {str(e)}")
-        return {"error": str(e)}
\ No newline at end of file
+        logger.error("Error in _request_analysis: %s", e)
+        return {"error": str(e)}
+
+def _request_batch_analysis(api_key, model_name, items):
+    """
+    Request analyses for several predictions in a single Groq call.
+    
+    Args:
+        items (list): (predicted_class, confidence) pairs.
+        
+    Returns:
+        list: One analysis dict per item, in the same order.
+    """
+    lesions = "\n".join(
+        f"        {i + 1}. '{predicted_class}' with {confidence:.2f}% confidence"
+        for i, (predicted_class, confidence) in enumerate(items)
+    )
+    
+    # Define the prompt; json_object mode requires an object, so the array is wrapped
+    prompt = f"""
+        You are a dermatology assistant. Based on an AI image analysis, the following skin lesions have been classified:
+{lesions}
+
+        For each lesion, please provide:
+        1. A brief description of this condition (2-3 sentences)
+        2. Three key characteristics to look for
+        3. Whether this condition generally requires urgent medical attention (Yes/No, with brief explanation)
+        4. Two follow-up questions a doctor might ask the patient about this condition
+        
+        Format your response as a JSON object with a single key "analyses" holding an array
+        with one object per lesion, in the order listed above. Each object has the following keys:{ANALYSIS_FORMAT}
+        
+        Ensure your response is valid JSON format.
+        """
+    
+    content, error = _post_chat(api_key, model_name, prompt)
+    if error:
+        return [{"error": error} for _ in items]
+    
+    parsed = _parse_json_content(content)
+    analyses = parsed.get('analyses') if isinstance(parsed, dict) else None
+    if not isinstance(analyses, list):
+        return [{"error": "Failed to parse JSON from Groq response"} for _ in items]
+    
+    # Pad a short answer so every waiting request gets a result
+    missing = [{"error": "No analysis returned for this item"} for _ in range(len(items) - len(analyses))]
+    return analyses[:len(items)] + missing
@@ -1,27 +1,84 @@
 # models/model.py
 import os
+import sys
+import threading
+import time
+import uuid
+import queue
+from collections import OrderedDict
+from concurrent.futures import Future
 import numpy as np
 import tensorflow as tf
 from flask import current_app
 import logging
-from models.groq_integration import get_groq_analysis
+from config import Config
+from models.groq_integration import submit_groq_analysis
+from extensions import cache
+from models.preprocessing import preprocess_image
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global variable to hold the loaded model
+# Directory holding the trained model files
+MODELS_DIR = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'models')
+
+# Class labels in the order of the model's outputs
+CLASS_LABELS = tuple(Config.SKIN_CONDITIONS)
+
+# Shape of a single preprocessed input image
+INPUT_SHAPE = (180, 180, 3)
+
+# Global variables to hold the loaded model and its traced forward pass
 _model = None
+_predict_fn = None
+
+# The TFLite interpreter is not thread-safe, so invocations are serialized
+_interpreter_lock = threading.Lock()
+
+# Concurrent predictions are coalesced into a single batched forward pass.
+# Batching is continuous: each pass takes whatever queued up during the previous
+# one, so a lone request never waits for a batch window to close
+BATCH_MAX_SIZE = 16
+PREDICTION_TIMEOUT = 30  # seconds
+_request_queue = queue.Queue()
+_batch_thread = None
+_batch_thread_lock = threading.Lock()
+
+# Prediction cache settings
+PREDICTION_CACHE_SIZE = 1024
+PREDICTION_CACHE_TTL = 3600  # seconds
+
+# LRU cache of (timestamp, result) pairs keyed by image content hash
+_prediction_cache = OrderedDict()
+_prediction_cache_lock = threading.Lock()
+
+# How long a background Groq analysis stays available to polls. Analyses live in
+# the app cache, which is shared between worker processes (see Config.CACHE_TYPE),
+# so polls may land on any worker
+ANALYSIS_TTL = 3600  # seconds
+
+# Fields of a prediction result describing its Groq analysis; these are resolved
+# per request rather than cached with the prediction
+_ANALYSIS_KEYS = ('additional_analysis', 'analysis_pending', 'analysis_id')
 
 def load_model():
-    """Load and return the TensorFlow model."""
-    global _model
+    """Load and return the TensorFlow model, preferring the quantized TFLite file."""
+    global _model, _predict_fn
     
     # If model is already loaded, return it
     if _model is not None:
         return _model
     
     try:
+        # Prefer the int8-quantized TFLite model if it has been converted
+        tflite_path = os.path.join(MODELS_DIR, 'model.tflite')
+        if os.path.exists(tflite_path):
+            try:
+                _model = load_tflite_model(tflite_path, Config.TFLITE_NUM_THREADS or None)
+                logger.info("Model loaded successfully from .tflite file")
+                return _model
+            except Exception as e:
+                logger.error("Error loading .tflite model: %s", e)
+        
         # Define custom objects to handle the 'auto' reduction parameter
         custom_objects = {
             'loss': 'categorical_crossentropy'
@@ -29,7 +86,7 @@ def load_model():
         
         # First try to load with custom objects and without compiling
         try:
-            model_path = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'models', 'model.h5')
+            model_path = os.path.join(MODELS_DIR, 'model.h5')
             _model = tf.keras.models.load_model(
                 model_path,
                 custom_objects=custom_objects,
@@ -46,11 +103,11 @@ def load_model():
             logger.info("Model loaded successfully from .h5 file")
             
         except Exception as e:
-            logger.error(f"Error loading .h5 model: {str(e)}")
+            logger.error("Error loading .h5 model: %s", e)
             
             # Try loading from SavedModel format as fallback
             try:
-                model_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'models', 'converted_model')
+                model_dir = os.path.join(MODELS_DIR, 'converted_model')
                 if os.path.exists(model_dir):
                     _model = tf.keras.models.load_model(model_dir)
                     logger.info("Model loaded successfully from SavedModel directory")
@@ -59,24 +116,147 @@ def load_model():
                     logger.warning("No model found. Creating a dummy model for development.")
                     _model = create_dummy_model()
             except Exception as e2:
-                logger.error(f"Error loading SavedModel: {str(e2)}")
+                logger.error("Error loading SavedModel: %s", e2)
                 # Create a dummy model for development
                 logger.warning("Creating a dummy model for development after all load attempts failed.")
                 _model = create_dummy_model()
         
+        # Specialize the forward pass for the fixed input shape and trace it now
+        _predict_fn = _build_predict_fn(_model)
+        
         return _model
         
     except Exception as e:
-        logger.error(f"Error in load_model: {str(e)}")
+        logger.error("Error in load_model: %s", e)
         return create_dummy_model()
 
+def load_tflite_model(model_path, num_threads=None):
+    """Load a TFLite model and allocate its tensors."""
+    # Loading from a path memory-maps the flatbuffer, so processes share its pages
+    interpreter = tf.lite.Interpreter(model_path=model_path, num_threads=num_threads or os.cpu_count())
+    interpreter.allocate_tensors()
+    return interpreter
+
+def reopen_tflite_model(num_threads=None):
+    """
+    Reopen the TFLite interpreter in a forked worker process.
+    
+    The interpreter's thread pool does not survive fork(), but the memory-mapped
+    model file stays shared with the parent, so reopening it is cheap.
+    
+    Args:
+        num_threads (int): Interpreter threads for this worker. Defaults to all CPUs.
+        
+    Returns:
+        The model to use in this process.
+    """
+    global _model
+    if isinstance(_model, tf.lite.Interpreter):
+        _model = load_tflite_model(os.path.join(MODELS_DIR, 'model.tflite'), num_threads)
+    return _model
+
+def convert_to_tflite(keras_model=None, output_path=None, sample_dir=None, quantization='int8'):
+    """
+    Convert the Keras model to a quantized TFLite model.
+    
+    Args:
+        keras_model (tf.keras.Model): Model to convert. Defaults to the model.h5 weights.
+        output_path (str): Where to write the .tflite file.
+        sample_dir (str): Directory of skin images used to calibrate the quantization ranges.
+        quantization (str): 'int8' for full integer quantization (uint8 input, fastest on
+            CPUs with VNNI), or 'float16' for fp16 weights with float32 activations, which
+            needs no calibration and keeps accuracy closest to the original model.
+        
+    Returns:
+        str: Path to the written .tflite file.
+    """
+    if keras_model is None:
+        keras_model = tf.keras.models.load_model(os.path.join(MODELS_DIR, 'model.h5'), compile=False)
+    if output_path is None:
+        output_path = os.path.join(MODELS_DIR, 'model.tflite')
+    if sample_dir is None:
+        sample_dir = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'static', 'img', 'conditions')
+    
+    def representative_dataset():
+        # Calibrate activations on real skin images, preprocessed exactly as at inference time
+        for filename in sorted(os.listdir(sample_dir)):
+            if filename.lower().endswith(('.png', '.jpg', '.jpeg')):
+                image_array = preprocess_image(os.path.join(sample_dir, filename))
+                yield [_normalize(image_array)]
+    
+    converter = tf.lite.TFLiteConverter.from_keras_model(keras_model)
+    converter.optimizations = [tf.lite.Optimize.DEFAULT]
+    if quantization == 'int8':
+        converter.representative_dataset = representative_dataset
+        converter.target_spec.supported_ops = [tf.lite.OpsSet.TFLITE_BUILTINS_INT8]
+        converter.inference_input_type = tf.uint8
+    elif quantization == 'float16':
+        converter.target_spec.supported_types = [tf.float16]
+    else:
+        raise ValueError(f"Unsupported quantization: {quantization}")
+    tflite_model = converter.convert()
+    
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    with open(output_path, 'wb') as f:
+        f.write(tflite_model)
+    
+    logger.info("%s TFLite model written to %s", quantization, output_path)
+    return output_path
+
+def _build_predict_fn(model):
+    """
+    Compile the Keras forward pass once and return a function running it on a uint8-normalized batch.
+    
+    With MODEL_JIT_COMPILE the pass is compiled by XLA. XLA builds one program per input
+    shape, so batches are padded up to a power of two and every padded size is compiled
+    at startup rather than on the first request that needs it.
+    
+    Args:
+        model: The loaded Keras model.
+        
+    Returns:
+        callable: Maps a float32 batch of images to a numpy array of class probabilities.
+    """
+    def trace(jit_compile):
+        predict_fn = tf.function(
+            lambda x: model(x, training=False),
+            input_signature=[tf.TensorSpec(shape=(None,) + INPUT_SHAPE, dtype=tf.float32)],
+            jit_compile=jit_compile
+        )
+        for batch_size in _padded_batch_sizes() if jit_compile else (1,):
+            predict_fn(tf.zeros((batch_size,) + INPUT_SHAPE))
+        return predict_fn
+    
+    if Config.MODEL_JIT_COMPILE:
+        try:
+            predict_fn = trace(jit_compile=True)
+        except Exception as e:
+            logger.warning("XLA compilation failed, using the plain graph: %s", e)
+        else:
+            def predict(batch):
+                padded_size = next(size for size in _padded_batch_sizes() if size >= len(batch))
+                padded = np.zeros((padded_size,) + INPUT_SHAPE, dtype=np.float32)
+                padded[:len(batch)] = batch
+                return predict_fn(tf.convert_to_tensor(padded)).numpy()[:len(batch)]
+            return predict
+    
+    predict_fn = trace(jit_compile=False)
+    return lambda batch: predict_fn(tf.convert_to_tensor(batch)).numpy()
+
+def _padded_batch_sizes():
+    """Return the batch sizes compiled by XLA: powers of two up to BATCH_MAX_SIZE."""
+    sizes = [1]
+    while sizes[-1] < BATCH_MAX_SIZE:
+        sizes.append(min(sizes[-1] * 2, BATCH_MAX_SIZE))
+    return sizes
+
 def create_dummy_model():
     """Create a dummy model for development purposes."""
     logger.info("Creating dummy model for development")
     
     # Simple sequential model
     model = tf.keras.Sequential([
-        tf.keras.layers.InputLayer(input_shape=(180, 180, 3)),
+        tf.keras.layers.InputLayer(input_shape=INPUT_SHAPE),
         tf.keras.layers.Conv2D(16, 3, activation='relu'),
         tf.keras.layers.MaxPooling2D(),
         tf.keras.layers.Flatten(),
@@ -92,57 +272,204 @@ def create_dummy_model():
     
     return model
 
+def _normalize(image_array):
+    """Scale uint8 pixels to the float32 [0, 1] range the Keras model was trained on."""
+    if image_array.dtype == np.uint8:
+        return np.multiply(image_array, 1.0 / 255.0, dtype=np.float32)
+    return image_array
+
+def _prepare_interpreter_input(image_array, input_details):
+    """Convert a batch of images to the dtype and quantization of the interpreter input."""
+    dtype = input_details['dtype']
+    if dtype == np.float32:
+        return _normalize(image_array)
+    
+    # Raw pixels already are the quantized values when the input scale is 1/255
+    scale, zero_point = input_details['quantization']
+    if image_array.dtype == dtype and zero_point == 0 and np.isclose(scale, 1.0 / 255.0):
+        return image_array
+    
+    # Otherwise quantize the normalized input to the integer type the model expects
+    dtype_info = np.iinfo(dtype)
+    image_array = np.clip(np.round(_normalize(image_array) / scale + zero_point), dtype_info.min, dtype_info.max)
+    return image_array.astype(dtype)
+
+def _run_model(model, image_array):
+    """Run a forward pass and return the class probabilities for the batch."""
+    if not isinstance(model, tf.lite.Interpreter):
+        image_array = _normalize(image_array)
+        if _predict_fn is None:
+            return model.predict(image_array)
+        return _predict_fn(image_array)
+    
+    input_details = model.get_input_details()[0]
+    output_details = model.get_output_details()[0]
+    image_array = _prepare_interpreter_input(image_array, input_details)
+    
+    # Pad to the same power-of-two sizes as the XLA path, so the interpreter is only
+    # reallocated for a handful of batch sizes, and run the whole batch in one invoke
+    batch_size = len(image_array)
+    padded_size = next(size for size in _padded_batch_sizes() if size >= batch_size)
+    if padded_size != batch_size:
+        padded = np.zeros((padded_size,) + image_array.shape[1:], dtype=image_array.dtype)
+        padded[:batch_size] = image_array
+        image_array = padded
+    
+    with _interpreter_lock:
+        if model.get_input_details()[0]['shape'][0] != padded_size:
+            model.resize_tensor_input(input_details['index'], (padded_size,) + INPUT_SHAPE)
+            model.allocate_tensors()
+        model.set_tensor(input_details['index'], image_array)
+        model.invoke()
+        predictions = model.get_tensor(output_details['index'])[:batch_size]
+    
+    # Dequantize integer outputs back to probabilities
+    if output_details['dtype'] != np.float32:
+        scale, zero_point = output_details['quantization']
+        predictions = (predictions.astype(np.float32) - zero_point) * scale
+    
+    return predictions
+
+def _ensure_batch_thread(model):
+    """Start the batching thread if it is not running in this process."""
+    global _batch_thread
+    with _batch_thread_lock:
+        if _batch_thread is None or not _batch_thread.is_alive():
+            _batch_thread = threading.Thread(target=_batch_worker, args=(model,), name='predict-batcher', daemon=True)
+            _batch_thread.start()
+
+def _batch_worker(model):
+    """Run one forward pass over every queued image, as soon as the model is free."""
+    while True:
+        batch = [_request_queue.get()]
+        while len(batch) < BATCH_MAX_SIZE:
+            try:
+                batch.append(_request_queue.get_nowait())
+            except queue.Empty:
+                break
+        
+        try:
+            # Concatenating copies the images, so callers may reuse their buffers afterwards
+            images = np.concatenate([image_array for image_array, _ in batch], axis=0)
+            predictions = _run_model(model, images)
+            for (_, future), prediction in zip(batch, predictions):
+                future.set_result(prediction)
+        except Exception as e:
+            for _, future in batch:
+                future.set_exception(e)
+
+def get_cached_prediction(image_hash):
+    """Return a copy of the cached prediction for an image hash with its Groq analysis resolved, or None if missing or expired."""
+    with _prediction_cache_lock:
+        entry = _prediction_cache.get(image_hash)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > PREDICTION_CACHE_TTL:
+            del _prediction_cache[image_hash]
+            return None
+        
+        # Mark as most recently used
+        _prediction_cache.move_to_end(image_hash)
+        result = dict(entry[1])
+    
+    # Analysis ids are transient, so look the analysis up again (cheap once the Groq cache has it)
+    result.update(_resolve_analysis(result['prediction'], result['confidence'] / 100))
+    return result
+
+def cache_prediction(image_hash, result):
+    """Cache a successful prediction result, evicting the least recently used entries."""
+    if 'error' in result:
+        return
+    
+    # Drop the analysis fields; they are resolved again on every cache hit
+    result = {key: value for key, value in result.items() if key not in _ANALYSIS_KEYS}
+    
+    with _prediction_cache_lock:
+        _prediction_cache[image_hash] = (time.monotonic(), result)
+        _prediction_cache.move_to_end(image_hash)
+        while len(_prediction_cache) > PREDICTION_CACHE_SIZE:
+            _prediction_cache.popitem(last=False)
+
+def _track_analysis(future):
+    """Record a pending Groq analysis in the app cache and return the id clients poll it by."""
+    analysis_id = uuid.uuid4().hex
+    key = f'groq-analysis/{analysis_id}'
+    app = current_app._get_current_object()
+    cache.set(key, {'pending': True}, timeout=ANALYSIS_TTL)
+    
+    def finish(future):
+        try:
+            analysis = future.result()
+        except Exception as e:
+            logger.error("Error in Groq analysis: %s", e)
+            analysis = None
+        
+        # Runs on the Groq thread, so it needs its own app context for the cache
+        with app.app_context():
+            cache.set(key, {'pending': False, 'analysis': analysis}, timeout=ANALYSIS_TTL)
+    
+    future.add_done_callback(finish)
+    return analysis_id
+
+def get_analysis(analysis_id):
+    """Return the status of a background Groq analysis ({'pending': ...} plus 'analysis'), or None."""
+    return cache.get(f'groq-analysis/{analysis_id}')
+
+def _resolve_analysis(predicted_class, confidence):
+    """Start (or reuse) the Groq analysis for a prediction and return the result's analysis fields."""
+    # Start the Groq analysis in the background if API key is available;
+    # clients poll /diagnose/analysis/<analysis_id> for the result
+    groq_api_key = current_app.config.get('GROQ_API_KEY', '')
+    additional_analysis = None
+    analysis_id = None
+    
+    if groq_api_key:
+        try:
+            future = submit_groq_analysis(predicted_class, confidence)
+            if future.done():
+                additional_analysis = future.result()
+            else:
+                analysis_id = _track_analysis(future)
+        except Exception as e:
+            logger.error("Error starting Groq analysis: %s", e)
+            additional_analysis = None
+    
+    return {
+        'additional_analysis': additional_analysis,
+        'analysis_pending': analysis_id is not None,
+        'analysis_id': analysis_id
+    }
+
 def predict_image(image_array):
     """Predict the skin condition from the image array."""
     try:
-        # Load the model if not already loaded
-        model = load_model()
+        # Use the model loaded at application startup
+        model = current_app.extensions['skin_model']
         
-        # Make prediction
-        predictions = model.predict(image_array)
+        # Make prediction, batched with any other in-flight requests
+        future = Future()
+        _ensure_batch_thread(model)
+        _request_queue.put((image_array, future))
+        predictions = np.expand_dims(future.result(timeout=PREDICTION_TIMEOUT), 0)
         
         # Get the class with highest probability
         predicted_class_index = np.argmax(predictions[0])
         confidence = float(predictions[0][predicted_class_index])
         
-        # Get the class labels
-        class_labels = [
-            'actinic keratosis',
-            'basal cell carcinoma',
-            'dermatofibroma',
-            'melanoma',
-            'nevus',
-            'pigmented benign keratosis',
-            'seborrheic keratosis',
-            'squamous cell carcinoma',
-            'vascular lesion'
-        ]
-        
         # Get the predicted class name
-        predicted_class = class_labels[predicted_class_index]
-        
-        # Use Groq for additional analysis if API key is available
-        groq_api_key = current_app.config.get('GROQ_API_KEY', '')
-        additional_analysis = None
-        
-        if groq_api_key:
-            try:
-                additional_analysis = get_groq_analysis(predicted_class, confidence)
-            except Exception as e:
-                logger.error(f"Error getting Groq analysis: {str(e)}")
-                additional_analysis = None
+        predicted_class = CLASS_LABELS[predicted_class_index]
         
         # Return prediction result
         return {
             'prediction': predicted_class,
             'confidence': round(confidence * 100, 2),
             'class_index': int(predicted_class_index),
-            'all_probabilities': {class_labels[i]: float(predictions[0][i]) for i in range(len(class_labels))},
-            'additional_analysis': additional_analysis
+            'all_probabilities': dict(zip(CLASS_LABELS, predictions[0].tolist())),
+            **_resolve_analysis(predicted_class, confidence)
         }
         
     except Exception as e:
-        logger.error(f"Error in predict_image: {str(e)}")
+        logger.error("Error in predict_image: %s", e)
         
         # Return fallback prediction
         return {
@@ -151,4 +478,9 @@ def predict_image(image_array):
             'class_index': -1,
             'all_probabilities': {},
             'error': str(e)
-        }
\ No newline at end of file
+        }
+
+if __name__ == '__main__':
+    # Convert model.h5 to the quantized TFLite model used at inference time
+    # (pass 'float16' to trade some speed for accuracy)
+    convert_to_tflite(quantization=sys.argv[1] if len(sys.argv) > 1 else 'int8')
\ No newline at end of file
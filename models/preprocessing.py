@@ -1,14 +1,20 @@
 # Image preprocessing# models/preprocessing.py
 import cv2
 import numpy as np
-from PIL import Image
-import tensorflow as tf
 import logging
 
-# Configure logging
-logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# libjpeg can decode at 1/2, 1/4 or 1/8 scale for far less work than a full decode
+_REDUCED_COLOR_FLAGS = (
+    (8, cv2.IMREAD_REDUCED_COLOR_8),
+    (4, cv2.IMREAD_REDUCED_COLOR_4),
+    (2, cv2.IMREAD_REDUCED_COLOR_2)
+)
+
+# JPEG start-of-frame markers, which carry the image dimensions
+_JPEG_SOF_MARKERS = frozenset(range(0xC0, 0xD0)) - {0xC4, 0xC8, 0xCC}
+
 def preprocess_image(image_path, target_size=(180, 180)):
     """
     Preprocess an image for prediction.
@@ -18,37 +24,85 @@ def preprocess_image(image_path, target_size=(180, 180)):
         target_size (tuple): Target size for the image (height, width).
         
     Returns:
-        numpy.ndarray: Preprocessed image array suitable for model input.
+        numpy.ndarray: Batch of one RGB image as raw uint8 pixels. This matches the
+        input dtype of the quantized TFLite model, whose input scale of 1/255 makes
+        the pixels its quantized [0, 1] values; float models normalize at the model
+        boundary.
     """
     try:
-        # Load the image using PIL
-        img = Image.open(image_path)
-        
-        # Resize the image
-        img = img.resize(target_size)
-        
-        # Convert to numpy array
-        img_array = np.array(img)
+        # Decode straight to 3-channel BGR (drops alpha, expands grayscale),
+        # at the smallest JPEG scale that is still no smaller than the target
+        data = np.fromfile(image_path, dtype=np.uint8)
+        img = cv2.imdecode(data, _decode_flag(data, max(target_size)))
         
-        # Ensure the image has 3 channels (RGB)
-        if len(img_array.shape) == 2:  # Grayscale
-            img_array = np.stack([img_array, img_array, img_array], axis=-1)
-        elif img_array.shape[2] == 4:  # RGBA
-            img_array = img_array[:, :, :3]  # Drop alpha channel
+        if img is None:
+            raise ValueError(f"Failed to read image: {image_path}")
         
-        # Expand dimensions to create a batch of size 1
-        img_array = np.expand_dims(img_array, axis=0)
+        # Resize the image
+        img = cv2.resize(img, target_size, interpolation=cv2.INTER_AREA)
         
-        # Normalize pixel values to [0, 1]
-        img_array = img_array.astype('float32') / 255.0
+        # Convert to RGB and add the batch dimension (a view, not a copy)
+        img_array = cv2.cvtColor(img, cv2.COLOR_BGR2RGB)[np.newaxis]
         
-        logger.info(f"Image preprocessed successfully: {image_path}")
+        logger.info("Image preprocessed successfully: %s", image_path)
         return img_array
         
     except Exception as e:
-        logger.error(f"Error preprocessing image: {str(e)}")
+        logger.error("Error preprocessing image: %s", e)
         raise
 
+def _jpeg_dimensions(data):
+    """
+    Read the dimensions of a JPEG from its start-of-frame header.
+    
+    Args:
+        data (numpy.ndarray): Raw bytes of the file as uint8.
+        
+    Returns:
+        tuple: (height, width), or None if the data is not a parsable JPEG.
+    """
+    buf = memoryview(data)
+    if len(buf) < 4 or buf[0] != 0xFF or buf[1] != 0xD8:
+        return None
+    
+    # Walk the marker segments until the frame header
+    i = 2
+    while i + 9 < len(buf):
+        if buf[i] != 0xFF:
+            return None
+        marker = buf[i + 1]
+        if marker == 0xFF:
+            i += 1
+            continue
+        if marker in _JPEG_SOF_MARKERS:
+            return int.from_bytes(buf[i + 5:i + 7], 'big'), int.from_bytes(buf[i + 7:i + 9], 'big')
+        if marker == 0x01 or 0xD0 <= marker <= 0xD9:
+            i += 2
+            continue
+        i += 2 + int.from_bytes(buf[i + 2:i + 4], 'big')
+    
+    return None
+
+def _decode_flag(data, min_side):
+    """
+    Pick the imdecode flag that decodes an image at the smallest scale keeping both sides >= min_side.
+    
+    Args:
+        data (numpy.ndarray): Raw bytes of the file as uint8.
+        min_side (int): Smallest side length the decoded image may have.
+        
+    Returns:
+        int: An OpenCV IMREAD_* flag.
+    """
+    dimensions = _jpeg_dimensions(data)
+    if dimensions is not None:
+        shortest = min(dimensions)
+        for factor, flag in _REDUCED_COLOR_FLAGS:
+            if shortest // factor >= min_side:
+                return flag
+    
+    return cv2.IMREAD_COLOR
+
 def enhance_image(image_path, output_path):
     """
     Enhance an image for better visualization and analysis.
@@ -65,19 +119,16 @@ def enhance_image(image_path, output_path):
         img = cv2.imread(image_path)
         
         if img is None:
-            logger.error(f"Failed to read image: {image_path}")
+            logger.error("Failed to read image: %s", image_path)
             return False
         
-        # Convert to float32 for processing
-        img_float = img.astype(np.float32) / 255.0
-        
-        # Apply contrast enhancement (CLAHE)
-        lab = cv2.cvtColor(img_float, cv2.COLOR_BGR2LAB)
+        # Apply contrast enhancement (CLAHE) in 8-bit LAB space
+        lab = cv2.cvtColor(img, cv2.COLOR_BGR2LAB)
         l_channel, a_channel, b_channel = cv2.split(lab)
         
         # Apply CLAHE to L-channel
         clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-        cl = clahe.apply(np.uint8(l_channel * 255)) / 255.0
+        cl = clahe.apply(l_channel)
         
         # Merge channels
         enhanced_lab = cv2.merge([cl, a_channel, b_channel])
@@ -85,19 +136,51 @@ def enhance_image(image_path, output_path):
         # Convert back to BGR
         enhanced_img = cv2.cvtColor(enhanced_lab, cv2.COLOR_LAB2BGR)
         
-        # Normalize
-        enhanced_img = np.clip(enhanced_img * 255, 0, 255).astype(np.uint8)
-        
         # Save the enhanced image
         cv2.imwrite(output_path, enhanced_img)
         
-        logger.info(f"Image enhanced successfully: {output_path}")
+        logger.info("Image enhanced successfully: %s", output_path)
         return True
         
     except Exception as e:
-        logger.error(f"Error enhancing image: {str(e)}")
+        logger.error("Error enhancing image: %s", e)
         return False
 
+def _glcm_stats(gray, dx=1, dy=0, levels=32):
+    """
+    Compute texture statistics from a symmetric, normalized GLCM.
+    
+    Args:
+        gray (numpy.ndarray): Grayscale uint8 image.
+        dx (int): Horizontal pixel offset of the neighbour (non-negative).
+        dy (int): Vertical pixel offset of the neighbour (non-negative).
+        levels (int): Number of gray levels the image is quantized to.
+        
+    Returns:
+        tuple: (contrast, energy, homogeneity).
+    """
+    # Quantize gray levels and pair every pixel with its neighbour at (dy, dx)
+    quantized = (gray.astype(np.int32) * levels) >> 8
+    height, width = quantized.shape
+    reference = quantized[:height - dy, :width - dx]
+    neighbour = quantized[dy:, dx:]
+    
+    # Count co-occurrences in one vectorized pass
+    glcm = np.bincount((reference * levels + neighbour).ravel(), minlength=levels * levels)
+    glcm = glcm.reshape(levels, levels).astype(np.float64)
+    glcm += glcm.T
+    total = glcm.sum()
+    if total == 0:
+        return 0.0, 0.0, 0.0
+    glcm /= total
+    
+    i, j = np.indices((levels, levels))
+    diff_sq = (i - j) ** 2
+    contrast = np.sum(glcm * diff_sq)
+    energy = np.sqrt(np.sum(glcm ** 2))
+    homogeneity = np.sum(glcm / (1.0 + diff_sq))
+    return contrast, energy, homogeneity
+
 def extract_features(img_array):
     """
     Extract features from an image that might be relevant for skin condition analysis.
@@ -128,33 +211,30 @@ def extract_features(img_array):
         # Convert to grayscale
         gray = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2GRAY)
         
-        # Extract color features (average color values in HSV space)
+        # Extract color features (per-channel mean and standard deviation in HSV space)
         img_hsv = cv2.cvtColor(img_bgr, cv2.COLOR_BGR2HSV)
-        hue_avg = np.mean(img_hsv[:, :, 0])
-        saturation_avg = np.mean(img_hsv[:, :, 1])
-        value_avg = np.mean(img_hsv[:, :, 2])
-        
-        # Calculate color variance (standard deviation)
-        hue_std = np.std(img_hsv[:, :, 0])
-        saturation_std = np.std(img_hsv[:, :, 1])
-        value_std = np.std(img_hsv[:, :, 2])
+        hsv_mean, hsv_std = cv2.meanStdDev(img_hsv)
+        hue_avg, saturation_avg, value_avg = hsv_mean[:, 0]
+        hue_std, saturation_std, value_std = hsv_std[:, 0]
         
         # Calculate texture features using GLCM (Gray-Level Co-occurrence Matrix)
-        # Simplified version - just calculate some basic statistics
-        # Real implementation would use a proper GLCM calculation
-        texture_contrast = np.std(gray)
-        texture_energy = np.sum(gray**2) / (gray.shape[0] * gray.shape[1])
+        texture_contrast, texture_energy, texture_homogeneity = _glcm_stats(gray)
         
         # Calculate shape features
         # Threshold the image (Otsu's method)
         _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY_INV + cv2.THRESH_OTSU)
         
-        # Find contours
-        contours, _ = cv2.findContours(thresh, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        # Label connected regions; stats holds the pixel area and bounding box of each
+        num_labels, labels, stats, _ = cv2.connectedComponentsWithStats(thresh, connectivity=8)
         
-        # If contours are found, calculate shape features
-        if contours:
-            largest_contour = max(contours, key=cv2.contourArea)
+        # If a foreground region is found, calculate shape features for the largest one
+        if num_labels > 1:
+            largest_label = 1 + np.argmax(stats[1:, cv2.CC_STAT_AREA])
+            
+            # Trace the outline of that region only
+            mask = (labels == largest_label).view(np.uint8)
+            contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+            largest_contour = contours[0]
             area = cv2.contourArea(largest_contour)
             perimeter = cv2.arcLength(largest_contour, True)
             
@@ -164,7 +244,8 @@ def extract_features(img_array):
                 circularity = 4 * np.pi * area / (perimeter**2)
                 
             # Calculate aspect ratio using bounding rectangle
-            x, y, w, h = cv2.boundingRect(largest_contour)
+            w = stats[largest_label, cv2.CC_STAT_WIDTH]
+            h = stats[largest_label, cv2.CC_STAT_HEIGHT]
             aspect_ratio = w / h if h > 0 else 0
             
             # Calculate solidity: area/convex hull area
@@ -190,7 +271,8 @@ def extract_features(img_array):
             },
             'texture': {
                 'contrast': float(texture_contrast),
-                'energy': float(texture_energy)
+                'energy': float(texture_energy),
+                'homogeneity': float(texture_homogeneity)
             },
             'shape': {
                 'area': float(area),
@@ -205,7 +287,7 @@ def extract_features(img_array):
         return features
         
     except Exception as e:
-        logger.error(f"Error extracting features: {str(e)}")
+        logger.error("Error extracting features: %s", e)
         return {
             'color': {},
             'texture': {},
@@ -1,19 +1,58 @@
 # routes/diagnosis.py
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify, session
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, jsonify
 import os
 from werkzeug.utils import secure_filename
-import uuid
+import io
+import secrets
+import shutil
 import time
+import threading
+from collections import OrderedDict
 from datetime import datetime
+from types import MappingProxyType
 
 # Import model related functions
-from models.model import predict_image
+from models.model import predict_image, get_cached_prediction, cache_prediction, get_analysis
 from models.preprocessing import preprocess_image
-from utils.helpers import allowed_file
+from utils.helpers import allowed_file, file_hash, detect_image_type
+from extensions import cache
 
 # Create a Blueprint for diagnosis routes
 diagnosis_bp = Blueprint('diagnosis', __name__)
 
+# Hashes of images that could not be decoded, rejected on re-upload for a while (oldest evicted first)
+FAILED_HASHES_SIZE = 1024
+FAILED_HASHES_TTL = 600  # seconds
+_failed_hashes = OrderedDict()
+_failed_hashes_lock = threading.Lock()
+
+# Error shown when an upload's content is not a JPEG or PNG, whatever its extension
+INVALID_IMAGE_MESSAGE = 'File is not a valid JPG or PNG image.'
+
+# Chunk size when copying uploads to disk
+COPY_CHUNK_SIZE = 1 << 20
+
+# How long a diagnosis result stays available to the results page. Results live in
+# the app cache, which is shared between worker processes (see Config.CACHE_TYPE),
+# so the redirect may land on any worker
+RESULTS_TTL = 600  # seconds
+
+# How long a queued inference job stays available to API polls. Job status lives in
+# the app cache, which is shared between worker processes (see Config.CACHE_TYPE),
+# so polls may land on any worker
+JOBS_TTL = 600  # seconds
+
+# Settings read from the app config once when the blueprint is registered:
+# the upload directory, and slots bounding how many inferences may be queued
+_upload_dir = None
+_inference_slots = None
+
+@diagnosis_bp.record_once
+def _init_from_config(state):
+    global _upload_dir, _inference_slots
+    _upload_dir = state.app.config['UPLOAD_FOLDER']
+    _inference_slots = threading.BoundedSemaphore(state.app.config['INFERENCE_QUEUE_SIZE'])
+
 @diagnosis_bp.route('/')
 def index():
     """Render the diagnosis upload page."""
@@ -41,66 +80,28 @@ def index():
 @diagnosis_bp.route('/upload', methods=['POST'])
 def upload():
     """Handle image upload and processing."""
-    # Check if the post request has the file part
-    if 'file' not in request.files:
-        flash('No file part', 'error')
-        return redirect(url_for('diagnosis.index'))
-    
-    file = request.files['file']
+    status, payload = _handle_upload(request.files.get('file'), wait=True)
     
-    # If user does not select file, browser might submit an empty file
-    if file.filename == '':
-        flash('No selected file', 'error')
+    if status != 200:
+        flash(payload['error'], 'error')
         return redirect(url_for('diagnosis.index'))
     
-    if file and allowed_file(file.filename):
-        # Generate a unique filename
-        original_filename = secure_filename(file.filename)
-        file_extension = os.path.splitext(original_filename)[1]
-        unique_filename = f"{str(uuid.uuid4())}{file_extension}"
-        
-        # Save the file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-        
-        try:
-            # Preprocess the image
-            preprocessed_image = preprocess_image(file_path)
-            
-            # Make prediction
-            prediction_result = predict_image(preprocessed_image)
-            
-            # Store results in session for the results page
-            session['diagnosis_result'] = {
-                'filename': unique_filename,
-                'original_filename': original_filename,
-                'prediction': prediction_result['prediction'],
-                'confidence': prediction_result['confidence'],
-                'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S')
-            }
-            
-            # Redirect to results page
-            return redirect(url_for('diagnosis.results'))
-            
-        except Exception as e:
-            current_app.logger.error(f"Error during prediction: {str(e)}")
-            flash('An error occurred during processing. Please try again.', 'error')
-            return redirect(url_for('diagnosis.index'))
-    else:
-        flash('File type not allowed. Please upload a JPG, JPEG, or PNG image.', 'error')
-        return redirect(url_for('diagnosis.index'))
+    # Keep the result server-side and pass only its token in the redirect
+    payload['timestamp'] = datetime.now().strftime('%Y-%m-%d %H:%M:%S')
+    token = _store_result(payload)
+    
+    # Redirect to results page
+    return redirect(url_for('diagnosis.results', t=token))
 
 @diagnosis_bp.route('/results')
 def results():
     """Display diagnosis results."""
-    # Check if results exist in session
-    if 'diagnosis_result' not in session:
+    # Look up the result stored by the upload
+    result = get_result(request.args.get('t', ''))
+    if result is None:
         flash('No diagnosis results found. Please upload an image first.', 'error')
         return redirect(url_for('diagnosis.index'))
     
-    # Get result from session
-    result = session['diagnosis_result']
-    
     # Get details about the predicted condition
     condition_info = get_condition_info(result['prediction'])
     
@@ -115,133 +116,333 @@ def results():
 @diagnosis_bp.route('/api/upload', methods=['POST'])
 def api_upload():
     """API endpoint for image upload and processing (for AJAX requests)."""
-    # Check if the post request has the file part
-    if 'file' not in request.files:
-        return jsonify({'success': False, 'error': 'No file part'}), 400
+    # Queue the inference and hand back a job id to poll
+    status, payload = _handle_upload(request.files.get('file'), wait=False)
+    return jsonify({'success': status < 400, **payload}), status
+
+@diagnosis_bp.route('/api/result/<job_id>')
+def api_result(job_id):
+    """API endpoint to poll for the prediction of a queued upload."""
+    job = get_job(job_id)
+    
+    if job is None:
+        return jsonify({'success': False, 'error': 'Unknown job id'}), 404
+    
+    if job['pending']:
+        return jsonify({'success': True, 'pending': True}), 202
+    
+    if 'error' in job:
+        return jsonify({'success': False, 'error': job['error']}), 500
+    
+    return jsonify({
+        'success': True, 
+        'pending': False,
+        'result': job['result']
+    })
+
+@diagnosis_bp.route('/analysis/<analysis_id>')
+def analysis(analysis_id):
+    """API endpoint to poll for the Groq analysis of a prediction."""
+    status = get_analysis(analysis_id)
+    
+    if status is None:
+        return jsonify({'success': False, 'error': 'Unknown analysis id'}), 404
+    
+    if status['pending']:
+        return jsonify({'success': True, 'pending': True}), 202
+    
+    return jsonify({
+        'success': True,
+        'pending': False,
+        'analysis': status['analysis']
+    })
+
+# Helper functions
+def _handle_upload(file, wait):
+    """
+    Validate and save an upload, then run or queue inference on it.
     
-    file = request.files['file']
+    Returns (status, payload): 200 with the prediction when wait is True, 202 with a job
+    id to poll when it is False, or an error status with {'error': message}.
+    """
+    # Check if the post request has the file part
+    if file is None:
+        return 400, {'error': 'No file part'}
     
     # If user does not select file, browser might submit an empty file
     if file.filename == '':
-        return jsonify({'success': False, 'error': 'No selected file'}), 400
+        return 400, {'error': 'No selected file'}
     
-    if file and allowed_file(file.filename):
-        # Generate a unique filename
-        original_filename = secure_filename(file.filename)
-        file_extension = os.path.splitext(original_filename)[1]
-        unique_filename = f"{str(uuid.uuid4())}{file_extension}"
-        
-        # Save the file
-        file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
-        
+    # Sniff the magic number before anything is written to disk
+    if not _is_image_stream(file.stream):
+        return 400, {'error': INVALID_IMAGE_MESSAGE}
+    
+    # Save the file under a random name
+    saved = _save_upload(file)
+    if saved is None:
+        return 400, {'error': 'File type not allowed. Please upload a JPG, JPEG, or PNG image.'}
+    unique_filename, original_filename, file_path = saved
+    
+    # Reject invalid files before doing any model work
+    image_hash = file_hash(file_path)
+    error = check_upload(file_path, image_hash)
+    if error:
+        os.remove(file_path)
+        return 400, {'error': error}
+    
+    # Run inference in the background pool; only block the request if asked to
+    future = _submit_inference(file_path, image_hash, block=wait)
+    if future is None:
+        os.remove(file_path)
+        return 503, {'error': 'Server is busy. Please try again shortly.'}
+    
+    if not wait:
+        return 202, {'job_id': _track_job(future, unique_filename, original_filename)}
+    
+    try:
+        prediction_result = future.result()
+    except Exception as e:
+        current_app.logger.error("Error during prediction: %s", e)
+        prediction_result = {'error': str(e)}
+    
+    if 'error' in prediction_result:
+        return 500, {'error': 'An error occurred during processing. Please try again.'}
+    
+    return 200, {
+        'filename': unique_filename,
+        'original_filename': original_filename,
+        'prediction': prediction_result['prediction'],
+        'confidence': prediction_result['confidence'],
+        'analysis_id': prediction_result.get('analysis_id')
+    }
+
+def _save_upload(file):
+    """Save an upload under a random name and return (unique_filename, original_filename, file_path), or None if its extension is not allowed."""
+    extension = allowed_file(file.filename)
+    if extension is None:
+        return None
+    
+    # The random hex name is already safe on disk; only the display name needs sanitizing
+    unique_filename = os.urandom(16).hex() + extension
+    file_path = os.path.join(_upload_dir, unique_filename)
+    _write_stream(file.stream, file_path)
+    
+    return unique_filename, secure_filename(file.filename), file_path
+
+def _write_stream(src, file_path):
+    """Copy an upload stream to disk, in kernel space with sendfile when the stream is backed by a real file."""
+    # Werkzeug spools small uploads in memory; calling fileno() on a SpooledTemporaryFile
+    # would first roll it over to a temp file on disk, so only ask for a descriptor once
+    # the spool is already file-backed (plain file objects have no _rolled flag)
+    src_fd = None
+    if getattr(src, '_rolled', True):
+        try:
+            src_fd = src.fileno()
+        except (AttributeError, io.UnsupportedOperation, OSError):
+            # In-memory streams such as BytesIO have no descriptor
+            src_fd = None
+    
+    if src_fd is not None and hasattr(os, 'sendfile'):
+        dst_fd = os.open(file_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
         try:
-            # Preprocess the image
-            preprocessed_image = preprocess_image(file_path)
+            offset = src.tell()
+            while True:
+                sent = os.sendfile(dst_fd, src_fd, offset, COPY_CHUNK_SIZE)
+                if sent == 0:
+                    break
+                offset += sent
+        finally:
+            os.close(dst_fd)
+        return
+    
+    with open(file_path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, COPY_CHUNK_SIZE)
+
+def _submit_inference(file_path, image_hash, block=True):
+    """Queue inference for a saved upload and return its Future, or None if the queue is full and block is False."""
+    if not _inference_slots.acquire(blocking=block):
+        return None
+    
+    try:
+        future = current_app.extensions['inference_pool'].submit(
+            _run_inference, current_app._get_current_object(), file_path, image_hash
+        )
+    except Exception:
+        _inference_slots.release()
+        raise
+    
+    future.add_done_callback(lambda _: _inference_slots.release())
+    return future
+
+def _run_inference(app, file_path, image_hash):
+    """Preprocess and classify a saved upload, reusing the prediction for an identical image."""
+    with app.app_context():
+        # Reuse the prediction for an identical image if we have one
+        prediction_result = get_cached_prediction(image_hash)
+        
+        if prediction_result is None:
+            # Preprocess on this inference thread. Only an image that cannot be
+            # decoded is remembered as bad; model errors and timeouts may be transient
+            try:
+                preprocessed_image = preprocess_image(file_path)
+            except Exception:
+                remember_failure(image_hash)
+                raise
             
             # Make prediction
             prediction_result = predict_image(preprocessed_image)
-            
-            # Add filename to result
-            prediction_result['filename'] = unique_filename
-            prediction_result['original_filename'] = original_filename
-            
-            return jsonify({
-                'success': True, 
-                'result': prediction_result
-            })
-            
+            cache_prediction(image_hash, prediction_result)
+        
+        return prediction_result
+
+def _track_job(future, unique_filename, original_filename):
+    """Record a queued inference in the app cache and return the id clients poll it by."""
+    job_id = os.urandom(16).hex()
+    key = f'diagnosis-job/{job_id}'
+    app = current_app._get_current_object()
+    cache.set(key, {'pending': True}, timeout=JOBS_TTL)
+    
+    def finish(future):
+        try:
+            # Add filename to a copy of the result; the original may be shared through the cache
+            job = {
+                'pending': False,
+                'result': dict(future.result(), filename=unique_filename, original_filename=original_filename)
+            }
         except Exception as e:
-            current_app.logger.error(f"Error during prediction: {str(e)}")
-            return jsonify({'success': False, 'error': str(e)}), 500
-    else:
-        return jsonify({
-            'success': False, 
-            'error': 'File type not allowed. Please upload a JPG, JPEG, or PNG image.'
-        }), 400
+            app.logger.error("Error during prediction: %s", e)
+            job = {'pending': False, 'error': str(e)}
+        
+        # Runs on the inference thread, so it needs its own app context for the cache
+        with app.app_context():
+            cache.set(key, job, timeout=JOBS_TTL)
+    
+    future.add_done_callback(finish)
+    return job_id
+
+def get_job(job_id):
+    """Return the status of a queued inference ({'pending': ...} plus 'result' or 'error'), or None."""
+    return cache.get(f'diagnosis-job/{job_id}')
+
+def _store_result(result):
+    """Store a diagnosis result for the results page and return its token."""
+    token = secrets.token_urlsafe(16)
+    cache.set(f'diagnosis-result/{token}', result, timeout=RESULTS_TTL)
+    return token
+
+def get_result(token):
+    """Return the diagnosis result stored under a token, or None if missing or expired."""
+    return cache.get(f'diagnosis-result/{token}')
+
+def _is_image_stream(stream):
+    """Return True if an upload stream starts with a JPEG or PNG signature, leaving it rewound."""
+    header = stream.read(12)
+    stream.seek(0)
+    return detect_image_type(header) is not None
+
+def check_upload(file_path, image_hash):
+    """Run cheap checks on a saved upload and return an error message, or None if it is valid."""
+    if os.path.getsize(file_path) > current_app.config['MAX_CONTENT_LENGTH']:
+        return 'File is too large. The maximum upload size is 16MB.'
+    
+    with _failed_hashes_lock:
+        failed_at = _failed_hashes.get(image_hash)
+        if failed_at is not None:
+            if time.monotonic() - failed_at <= FAILED_HASHES_TTL:
+                return 'This image could not be processed. Please try a different image.'
+            del _failed_hashes[image_hash]
+    
+    return None
+
+def remember_failure(image_hash):
+    """Record an image that could not be decoded so re-uploads are rejected early."""
+    with _failed_hashes_lock:
+        _failed_hashes[image_hash] = time.monotonic()
+        _failed_hashes.move_to_end(image_hash)
+        while len(_failed_hashes) > FAILED_HASHES_SIZE:
+            _failed_hashes.popitem(last=False)
 
-# Helper functions
 def get_condition_info(condition_name):
     """Get detailed information about a skin condition."""
-    # This would typically come from a database, but for simplicity we're hardcoding it
-    conditions = {
-        'actinic keratosis': {
-            'name': 'Actinic Keratosis',
-            'description': 'Actinic keratoses are dry scaly patches of skin that have been damaged by the sun. The patches are not usually serious, but there\'s a small chance they could become skin cancer.',
-            'severity': 'Moderate',
-            'treatments': [
-                'Prescription creams and gels',
-                'Freezing the patches (cryotherapy)',
-                'Surgery to cut out or scrape away the patches',
-                'Photodynamic therapy (PDT)'
-            ],
-            'learn_more_url': 'https://www.nhs.uk/conditions/actinic-keratoses'
-        },
-        'basal cell carcinoma': {
-            'name': 'Basal Cell Carcinoma',
-            'description': 'Basal cell carcinoma is a type of skin cancer that begins in the basal cells — a type of cell within the skin that produces new skin cells as old ones die off.',
-            'severity': 'High',
-            'symptoms': [
-                'A shiny, skin-colored bump that\'s translucent',
-                'A brown, black or blue lesion with a raised border',
-                'A flat, scaly patch with a raised edge',
-                'A white, waxy, scar-like lesion'
-            ],
-            'learn_more_url': 'https://www.mayoclinic.org/diseases-conditions/basal-cell-carcinoma/symptoms-causes/syc-20354187'
-        },
-        'melanoma': {
-            'name': 'Melanoma',
-            'description': 'Melanoma, the most serious type of skin cancer, develops in the cells that produce melanin — the pigment that gives your skin its color.',
-            'severity': 'Very High',
-            'warning_signs': [
-                'A change in an existing mole',
-                'The development of a new pigmented growth on your skin'
-            ],
-            'learn_more_url': 'https://www.mayoclinic.org/diseases-conditions/melanoma/symptoms-causes/syc-20374884'
-        },
-        # Add other conditions here...
-    }
+    # Return condition info or default if not found
+    info = _CONDITION_INFO.get(condition_name.lower())
+    if info is not None:
+        return info
     
     # Default information if condition not found
-    default_info = {
+    return {
         'name': condition_name.title(),
         'description': 'A skin condition that requires professional evaluation.',
         'severity': 'Unknown',
         'learn_more_url': url_for('education.conditions')
     }
-    
-    # Return condition info or default if not found
-    return conditions.get(condition_name.lower(), default_info)
 
 def generate_recommendations(condition_name):
     """Generate recommendations based on the diagnosed condition."""
-    # Common recommendations for all conditions
-    common_recommendations = [
-        'Schedule an appointment with a dermatologist for a professional evaluation',
-        'Take clear photos of the affected area to show your doctor',
-        'Protect your skin from sun exposure and use SPF 30+ sunscreen daily',
-        'Perform regular skin self-examinations'
-    ]
-    
-    # Condition-specific recommendations
-    condition_specific = {
-        'actinic keratosis': [
-            'Avoid direct sun exposure, especially during peak hours (10 AM to 4 PM)',
-            'Use skin moisturizers regularly to reduce dryness'
-        ],
-        'basal cell carcinoma': [
-            'Seek medical attention within the next 2-3 weeks',
-            'Avoid picking at or irritating the lesion'
-        ],
-        'melanoma': [
-            'Seek medical attention as soon as possible (within 1 week)',
-            'Check for any other suspicious spots on your skin'
-        ],
-        # Add other conditions here...
-    }
-    
-    # Get specific recommendations or empty list if not found
-    specific_recs = condition_specific.get(condition_name.lower(), [])
-    
-    # Combine and return all recommendations
-    return common_recommendations + specific_recs
\ No newline at end of file
+    # Combine common and condition-specific recommendations
+    return _COMMON_RECOMMENDATIONS + _CONDITION_SPECIFIC_RECOMMENDATIONS.get(condition_name.lower(), ())
+
+# Static condition details for the results page, built once at import and shared read-only.
+# This would typically come from a database, but for simplicity we're hardcoding it
+_CONDITION_INFO = MappingProxyType({
+    'actinic keratosis': MappingProxyType({
+        'name': 'Actinic Keratosis',
+        'description': 'Actinic keratoses are dry scaly patches of skin that have been damaged by the sun. The patches are not usually serious, but there\'s a small chance they could become skin cancer.',
+        'severity': 'Moderate',
+        'treatments': (
+            'Prescription creams and gels',
+            'Freezing the patches (cryotherapy)',
+            'Surgery to cut out or scrape away the patches',
+            'Photodynamic therapy (PDT)'
+        ),
+        'learn_more_url': 'https://www.nhs.uk/conditions/actinic-keratoses'
+    }),
+    'basal cell carcinoma': MappingProxyType({
+        'name': 'Basal Cell Carcinoma',
+        'description': 'Basal cell carcinoma is a type of skin cancer that begins in the basal cells — a type of cell within the skin that produces new skin cells as old ones die off.',
+        'severity': 'High',
+        'symptoms': (
+            'A shiny, skin-colored bump that\'s translucent',
+            'A brown, black or blue lesion with a raised border',
+            'A flat, scaly patch with a raised edge',
+            'A white, waxy, scar-like lesion'
+        ),
+        'learn_more_url': 'https://www.mayoclinic.org/diseases-conditions/basal-cell-carcinoma/symptoms-causes/syc-20354187'
+    }),
+    'melanoma': MappingProxyType({
+        'name': 'Melanoma',
+        'description': 'Melanoma, the most serious type of skin cancer, develops in the cells that produce melanin — the pigment that gives your skin its color.',
+        'severity': 'Very High',
+        'warning_signs': (
+            'A change in an existing mole',
+            'The development of a new pigmented growth on your skin'
+        ),
+        'learn_more_url': 'https://www.mayoclinic.org/diseases-conditions/melanoma/symptoms-causes/syc-20374884'
+    }),
+    # Add other conditions here...
+})
+
+# Common recommendations for all conditions
+_COMMON_RECOMMENDATIONS = (
+    'Schedule an appointment with a dermatologist for a professional evaluation',
+    'Take clear photos of the affected area to show your doctor',
+    'Protect your skin from sun exposure and use SPF 30+ sunscreen daily',
+    'Perform regular skin self-examinations'
+)
+
+# Condition-specific recommendations
+_CONDITION_SPECIFIC_RECOMMENDATIONS = MappingProxyType({
+    'actinic keratosis': (
+        'Avoid direct sun exposure, especially during peak hours (10 AM to 4 PM)',
+        'Use skin moisturizers regularly to reduce dryness'
+    ),
+    'basal cell carcinoma': (
+        'Seek medical attention within the next 2-3 weeks',
+        'Avoid picking at or irritating the lesion'
+    ),
+    'melanoma': (
+        'Seek medical attention as soon as possible (within 1 week)',
+        'Check for any other suspicious spots on your skin'
+    ),
+    # Add other conditions here...
+})
@@ -1,41 +1,36 @@
 # routes/education.py
 from flask import Blueprint, render_template, request, abort, current_app
+from types import MappingProxyType
+from extensions import cache, has_pending_flashes, add_etag
 
 # Create a Blueprint for education routes
 education_bp = Blueprint('education', __name__)
 
+# Tag rendered pages with ETags so revalidations get a 304
+education_bp.after_request(add_etag)
+
 @education_bp.route('/')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def index():
     """Render the education home page."""
     return render_template('education/index.html')
 
 @education_bp.route('/conditions')
+@cache.cached(timeout=600, query_string=True, unless=has_pending_flashes)
 def conditions():
     """Render the page listing all skin conditions."""
     # Get query parameters for filtering and sorting
     search_query = request.args.get('search', '').lower()
     sort_by = request.args.get('sort', 'name')  # Default sort by name
     
-    # Get all conditions data
-    all_conditions = get_all_conditions()
+    # Pick the pre-sorted list; unknown sort options fall back to name
+    sorted_conditions = _SORTED_CONDITIONS.get(sort_by, _BY_NAME)
     
-    # Filter conditions based on search query
+    # Filter conditions based on search query (keeps the sort order)
     if search_query:
-        filtered_conditions = [c for c in all_conditions if search_query in c['name'].lower()]
+        filtered_conditions = [c for c in sorted_conditions if search_query in c['_name_lc']]
     else:
-        filtered_conditions = all_conditions
-    
-    # Sort conditions
-    if sort_by == 'severity':
-        # Define severity order for sorting
-        severity_order = {'low': 1, 'moderate': 2, 'high': 3, 'very high': 4}
-        filtered_conditions.sort(key=lambda x: severity_order.get(x['severity'].lower(), 0), reverse=True)
-    elif sort_by == 'prevalence':
-        # Define prevalence order for sorting
-        prevalence_order = {'rare': 1, 'less common': 2, 'common': 3, 'very common': 4}
-        filtered_conditions.sort(key=lambda x: prevalence_order.get(x['prevalence'].lower(), 0), reverse=True)
-    else:  # Default to sorting by name
-        filtered_conditions.sort(key=lambda x: x['name'])
+        filtered_conditions = sorted_conditions
     
     return render_template('education/conditions.html', 
                           conditions=filtered_conditions,
@@ -43,6 +38,7 @@ def conditions():
                           sort_by=sort_by)
 
 @education_bp.route('/conditions/<condition_id>')
+@cache.cached(timeout=600, unless=has_pending_flashes)
 def condition_detail(condition_id):
     """Render detailed information for a specific condition."""
     # Get condition data by ID or slug
@@ -59,6 +55,7 @@ def condition_detail(condition_id):
                           related_conditions=related_conditions)
 
 @education_bp.route('/prevention')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def prevention():
     """Render information about skin cancer prevention."""
     prevention_tips = [
@@ -97,6 +94,7 @@ def prevention():
     return render_template('education/prevention.html', prevention_tips=prevention_tips)
 
 @education_bp.route('/self-examination')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def self_examination():
     """Render guide for skin self-examination."""
     examination_steps = [
@@ -135,6 +133,7 @@ def self_examination():
                           abcde_rule=abcde_rule)
 
 @education_bp.route('/resources')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def resources():
     """Render educational resources and links."""
     resource_categories = [
@@ -207,157 +206,164 @@ def resources():
     
     return render_template('education/resources.html', resource_categories=resource_categories)
 
+# Static condition data, built once at import and shared read-only across requests.
+# Each entry also carries its lowercased name for the search filter.
+_ALL_CONDITIONS = tuple(MappingProxyType({**condition, '_name_lc': condition['name'].lower()}) for condition in (
+    {
+        'id': 'actinic-keratosis',
+        'name': 'Actinic Keratosis',
+        'image': 'conditions/actinic-keratosis.jpg',
+        'description': 'Actinic keratoses are dry scaly patches of skin that have been damaged by the sun.',
+        'severity': 'Moderate',
+        'prevalence': 'Common',
+        'related': ('squamous-cell-carcinoma', 'basal-cell-carcinoma')
+    },
+    {
+        'id': 'basal-cell-carcinoma',
+        'name': 'Basal Cell Carcinoma',
+        'image': 'conditions/basal-cell-carcinoma.jpg',
+        'description': 'Basal cell carcinoma is a type of skin cancer that begins in the basal cells — a type of cell within the skin that produces new skin cells as old ones die off.',
+        'severity': 'High',
+        'prevalence': 'Very common',
+        'related': ('squamous-cell-carcinoma', 'actinic-keratosis')
+    },
+    {
+        'id': 'dermatofibroma',
+        'name': 'Dermatofibroma',
+        'image': 'conditions/dermatofibroma.jpg',
+        'description': 'Dermatofibromas are harmless growths within the skin that usually have a small diameter.',
+        'severity': 'Low',
+        'prevalence': 'Common',
+        'related': ('nevus',)
+    },
+    {
+        'id': 'melanoma',
+        'name': 'Melanoma',
+        'image': 'conditions/melanoma.jpg',
+        'description': 'Melanoma, the most serious type of skin cancer, develops in the cells that produce melanin — the pigment that gives your skin its color.',
+        'severity': 'Very high',
+        'prevalence': 'Less common',
+        'related': ('nevus', 'basal-cell-carcinoma')
+    },
+    {
+        'id': 'nevus',
+        'name': 'Nevus',
+        'image': 'conditions/nevus.jpg',
+        'description': 'Nevus (plural: nevi) is the medical term for a mole. Nevi are very common. Most people have between 10 and 40.',
+        'severity': 'Low',
+        'prevalence': 'Very common',
+        'related': ('melanoma', 'dermatofibroma')
+    },
+    {
+        'id': 'pigmented-benign-keratosis',
+        'name': 'Pigmented Benign Keratosis',
+        'image': 'conditions/pigmented-benign-keratosis.jpg',
+        'description': 'Pigmented benign keratosis refers to a group of non-cancerous skin growths that appear as thickened, wartlike lesions on the skin.',
+        'severity': 'Low',
+        'prevalence': 'Common',
+        'related': ('seborrheic-keratosis', 'actinic-keratosis')
+    },
+    {
+        'id': 'seborrheic-keratosis',
+        'name': 'Seborrheic Keratosis',
+        'image': 'conditions/seborrheic-keratosis.jpg',
+        'description': 'A seborrheic keratosis is a common noncancerous skin growth. People tend to get more of them as they get older.',
+        'severity': 'Low',
+        'prevalence': 'Very common',
+        'related': ('pigmented-benign-keratosis',)
+    },
+    {
+        'id': 'squamous-cell-carcinoma',
+        'name': 'Squamous Cell Carcinoma',
+        'image': 'conditions/squamous-cell-carcinoma.jpg',
+        'description': 'Squamous cell carcinoma of the skin is a common form of skin cancer that develops in the squamous cells that make up the middle and outer layers of the skin.',
+        'severity': 'High',
+        'prevalence': 'Common',
+        'related': ('basal-cell-carcinoma', 'actinic-keratosis')
+    },
+    {
+        'id': 'vascular-lesion',
+        'name': 'Vascular Lesion',
+        'image': 'conditions/vascular-lesion.jpg',
+        'description': 'Vascular lesions are relatively common abnormalities of the skin and underlying tissues, more commonly known as birthmarks.',
+        'severity': 'Varies',
+        'prevalence': 'Less common',
+        'related': ()
+    }
+))
+
+# Index of conditions by ID for O(1) lookups
+_ID_INDEX = {condition['id']: condition for condition in _ALL_CONDITIONS}
+
+# Additional detailed information for the condition detail pages
+_DETAILS_BY_ID = {
+    'actinic-keratosis': {
+        'detailed_description': """
+        Actinic keratoses (also called solar keratoses) are dry scaly patches of skin that have been damaged by the sun.
+        The patches are not usually serious. But there's a small chance they could become skin cancer, so it's important to avoid further damage to your skin.
+        """,
+        'treatments': (
+            'Prescription creams and gels',
+            'Freezing the patches (cryotherapy)',
+            'Surgery to cut out or scrape away the patches',
+            'Photodynamic therapy (PDT)'
+        )
+    },
+    'melanoma': {
+        'detailed_description': """
+        Melanoma, the most serious type of skin cancer, develops in the cells (melanocytes) that produce melanin — the pigment that gives your skin its color.
+        Melanoma can also form in your eyes and, rarely, inside your body, such as in your nose or throat. The exact cause of all melanomas isn't clear,
+        but exposure to ultraviolet (UV) radiation from sunlight or tanning lamps and beds increases your risk of developing melanoma.
+        """,
+        'warning_signs': (
+            'A change in an existing mole',
+            'The development of a new pigmented or unusual-looking growth on your skin'
+        ),
+        'hidden_melanomas': (
+            'Melanoma under a nail',
+            'Melanoma in the mouth, digestive tract, urinary tract or vagina',
+            'Melanoma in the eye'
+        )
+    },
+    # Add more condition-specific information for other conditions...
+}
+
+# Conditions merged with their detailed information, so detail lookups allocate nothing
+_DETAILED_BY_ID = {
+    condition_id: MappingProxyType({**condition, **_DETAILS_BY_ID.get(condition_id, {})})
+    for condition_id, condition in _ID_INDEX.items()
+}
+
+# Related conditions resolved once per condition (unknown IDs are skipped)
+_RELATED_BY_ID = {
+    condition_id: tuple(_ID_INDEX[related_id] for related_id in condition['related'] if related_id in _ID_INDEX)
+    for condition_id, condition in _ID_INDEX.items()
+}
+
+# Ranks used for sorting; unknown values sort last
+_SEVERITY_ORDER = {'low': 1, 'moderate': 2, 'high': 3, 'very high': 4}
+_PREVALENCE_ORDER = {'rare': 1, 'less common': 2, 'common': 3, 'very common': 4}
+
+# Conditions pre-sorted for each sort option of the conditions page
+_BY_NAME = tuple(sorted(_ALL_CONDITIONS, key=lambda x: x['name']))
+_BY_SEVERITY_DESC = tuple(sorted(_ALL_CONDITIONS, key=lambda x: _SEVERITY_ORDER.get(x['severity'].lower(), 0), reverse=True))
+_BY_PREVALENCE_DESC = tuple(sorted(_ALL_CONDITIONS, key=lambda x: _PREVALENCE_ORDER.get(x['prevalence'].lower(), 0), reverse=True))
+_SORTED_CONDITIONS = {
+    'name': _BY_NAME,
+    'severity': _BY_SEVERITY_DESC,
+    'prevalence': _BY_PREVALENCE_DESC
+}
+
 # Helper functions
 def get_all_conditions():
     """Get information about all skin conditions."""
-    return [
-        {
-            'id': 'actinic-keratosis',
-            'name': 'Actinic Keratosis',
-            'image': 'conditions/actinic-keratosis.jpg',
-            'description': 'Actinic keratoses are dry scaly patches of skin that have been damaged by the sun.',
-            'severity': 'Moderate',
-            'prevalence': 'Common',
-            'related': ['squamous-cell-carcinoma', 'basal-cell-carcinoma']
-        },
-        {
-            'id': 'basal-cell-carcinoma',
-            'name': 'Basal Cell Carcinoma',
-            'image': 'conditions/basal-cell-carcinoma.jpg',
-            'description': 'Basal cell carcinoma is a type of skin cancer that begins in the basal cells — a type of cell within the skin that produces new skin cells as old ones die off.',
-            'severity': 'High',
-            'prevalence': 'Very common',
-            'related': ['squamous-cell-carcinoma', 'actinic-keratosis']
-        },
-        {
-            'id': 'dermatofibroma',
-            'name': 'Dermatofibroma',
-            'image': 'conditions/dermatofibroma.jpg',
-            'description': 'Dermatofibromas are harmless growths within the skin that usually have a small diameter.',
-            'severity': 'Low',
-            'prevalence': 'Common',
-            'related': ['nevus']
-        },
-        {
-            'id': 'melanoma',
-            'name': 'Melanoma',
-            'image': 'conditions/melanoma.jpg',
-            'description': 'Melanoma, the most serious type of skin cancer, develops in the cells that produce melanin — the pigment that gives your skin its color.',
-            'severity': 'Very high',
-            'prevalence': 'Less common',
-            'related': ['nevus', 'basal-cell-carcinoma']
-        },
-        {
-            'id': 'nevus',
-            'name': 'Nevus',
-            'image': 'conditions/nevus.jpg',
-            'description': 'Nevus (plural: nevi) is the medical term for a mole. Nevi are very common. Most people have between 10 and 40.',
-            'severity': 'Low',
-            'prevalence': 'Very common',
-            'related': ['melanoma', 'dermatofibroma']
-        },
-        {
-            'id': 'pigmented-benign-keratosis',
-            'name': 'Pigmented Benign Keratosis',
-            'image': 'conditions/pigmented-benign-keratosis.jpg',
-            'description': 'Pigmented benign keratosis refers to a group of non-cancerous skin growths that appear as thickened, wartlike lesions on the skin.',
-            'severity': 'Low',
-            'prevalence': 'Common',
-            'related': ['seborrheic-keratosis', 'actinic-keratosis']
-        },
-        {
-            'id': 'seborrheic-keratosis',
-            'name': 'Seborrheic Keratosis',
-            'image': 'conditions/seborrheic-keratosis.jpg',
-            'description': 'A seborrheic keratosis is a common noncancerous skin growth. People tend to get more of them as they get older.',
-            'severity': 'Low',
-            'prevalence': 'Very common',
-            'related': ['pigmented-benign-keratosis']
-        },
-        {
-            'id': 'squamous-cell-carcinoma',
-            'name': 'Squamous Cell Carcinoma',
-            'image': 'conditions/squamous-cell-carcinoma.jpg',
-            'description': 'Squamous cell carcinoma of the skin is a common form of skin cancer that develops in the squamous cells that make up the middle and outer layers of the skin.',
-            'severity': 'High',
-            'prevalence': 'Common',
-            'related': ['basal-cell-carcinoma', 'actinic-keratosis']
-        },
-        {
-            'id': 'vascular-lesion',
-            'name': 'Vascular Lesion',
-            'image': 'conditions/vascular-lesion.jpg',
-            'description': 'Vascular lesions are relatively common abnormalities of the skin and underlying tissues, more commonly known as birthmarks.',
-            'severity': 'Varies',
-            'prevalence': 'Less common',
-            'related': []
-        }
-    ]
+    return list(_ALL_CONDITIONS)
 
 def get_condition_by_id(condition_id):
     """Get detailed information about a specific condition by ID."""
-    all_conditions = get_all_conditions()
-    
-    # Find the condition by ID
-    for condition in all_conditions:
-        if condition['id'] == condition_id:
-            # Add additional detailed information
-            if condition_id == 'actinic-keratosis':
-                condition['detailed_description'] = """
-                Actinic keratoses (also called solar keratoses) are dry scaly patches of skin that have been damaged by the sun.
-                The patches are not usually serious. But there's a small chance they could become skin cancer, so it's important to avoid further damage to your skin.
-                """
-                condition['treatments'] = [
-                    'Prescription creams and gels',
-                    'Freezing the patches (cryotherapy)',
-                    'Surgery to cut out or scrape away the patches',
-                    'Photodynamic therapy (PDT)'
-                ]
-            elif condition_id == 'melanoma':
-                condition['detailed_description'] = """
-                Melanoma, the most serious type of skin cancer, develops in the cells (melanocytes) that produce melanin — the pigment that gives your skin its color.
-                Melanoma can also form in your eyes and, rarely, inside your body, such as in your nose or throat. The exact cause of all melanomas isn't clear,
-                but exposure to ultraviolet (UV) radiation from sunlight or tanning lamps and beds increases your risk of developing melanoma.
-                """
-                condition['warning_signs'] = [
-                    'A change in an existing mole',
-                    'The development of a new pigmented or unusual-looking growth on your skin'
-                ]
-                condition['hidden_melanomas'] = [
-                    'Melanoma under a nail',
-                    'Melanoma in the mouth, digestive tract, urinary tract or vagina',
-                    'Melanoma in the eye'
-                ]
-            # Add more condition-specific information for other conditions...
-            
-            return condition
-    
-    # Return None if condition not found
-    return None
+    # Returns None if condition not found
+    return _DETAILED_BY_ID.get(condition_id)
 
 def get_related_conditions(condition_id):
     """Get related conditions for a specific condition."""
-    # Get all conditions
-    all_conditions = get_all_conditions()
-    
-    # Find the condition by ID
-    current_condition = None
-    for condition in all_conditions:
-        if condition['id'] == condition_id:
-            current_condition = condition
-            break
-    
-    if not current_condition:
-        return []
-    
-    # Get related conditions
-    related_ids = current_condition.get('related', [])
-    related_conditions = []
-    
-    for related_id in related_ids:
-        for condition in all_conditions:
-            if condition['id'] == related_id:
-                related_conditions.append(condition)
-                break
-    
-    return related_conditions
\ No newline at end of file
+    return _RELATED_BY_ID.get(condition_id, ())
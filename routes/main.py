@@ -1,110 +1,193 @@
 # routes/main.py
-from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app
-from utils.email_service import send_contact_email
-from utils.validators import validate_contact_form
+from flask import Blueprint, render_template, request, flash, redirect, url_for, current_app, make_response
+from types import MappingProxyType
+from extensions import cache, has_pending_flashes, add_etag
+from tasks import send_contact_email_task
+from utils.validators import validate_contact_form, MAX_EMAIL_LENGTH
+import logging
+
+logger = logging.getLogger(__name__)
 
 # Create a Blueprint for the main routes
 main_bp = Blueprint('main', __name__)
 
+# Tag rendered pages with ETags so revalidations get a 304
+main_bp.after_request(add_etag)
+
+# How long browsers and shared caches (CDN, reverse proxy) may reuse the static pages
+STATIC_PAGE_MAX_AGE = 3600  # seconds
+
+# Longest contact form fields accepted
+MAX_NAME_LENGTH = 200
+MAX_SUBJECT_LENGTH = 200
+MAX_MESSAGE_LENGTH = 5000
+
+# Google Maps API key for the doctor finder, read from the app config once when the blueprint is registered
+_google_maps_api_key = None
+
+# URL of the contact page for the post-submit redirect, built with url_for on the
+# first submission so it includes the blueprint prefix and the app's SCRIPT_NAME
+_contact_url = None
+
+# Templates of pages without view-specific context, loaded on first render and reused
+_static_templates = {}
+
+@main_bp.record_once
+def _init_from_config(state):
+    global _google_maps_api_key
+    _google_maps_api_key = state.app.config['GOOGLE_MAPS_API_KEY']
+
+# Team member information for the about page, shared read-only across requests
+_TEAM_MEMBERS = (
+    MappingProxyType({
+        'name': 'Dr. Sarah Johnson',
+        'role': 'Medical Director',
+        'bio': 'Board-certified dermatologist with over 15 years of experience in skin cancer detection and treatment.',
+        'image': 'team/doctor1.jpg'
+    }),
+    MappingProxyType({
+        'name': 'Dr. Michael Chen',
+        'role': 'AI Research Lead',
+        'bio': 'PhD in Machine Learning with a focus on medical imaging analysis and deep learning applications in healthcare.',
+        'image': 'team/researcher.jpg'
+    }),
+    MappingProxyType({
+        'name': 'Dr. Emily Rodriguez',
+        'role': 'Clinical Advisor',
+        'bio': 'Oncology specialist with expertise in melanoma treatment and early detection protocols.',
+        'image': 'team/doctor2.jpg'
+    })
+)
+
+# Research papers and publications
+_PUBLICATIONS = (
+    MappingProxyType({
+        'title': 'Deep Learning for Automated Detection of Melanoma in Dermoscopic Images',
+        'journal': 'Journal of Medical Imaging',
+        'year': 2023,
+        'url': '#'
+    }),
+    MappingProxyType({
+        'title': 'Comparison of Machine Learning Algorithms for Skin Lesion Classification',
+        'journal': 'JAMA Dermatology',
+        'year': 2022,
+        'url': '#'
+    }),
+    MappingProxyType({
+        'title': 'Improving Early Detection of Skin Cancer through AI-Assisted Diagnosis',
+        'journal': 'Nature Medicine',
+        'year': 2021,
+        'url': '#'
+    })
+)
+
 @main_bp.route('/')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def index():
     """Render the home page."""
-    return render_template('index.html')
+    return _static_response('index.html')
 
 @main_bp.route('/about')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def about():
     """Render the about page."""
-    # Team member information for the about page
-    team_members = [
-        {
-            'name': 'Dr. Sarah Johnson',
-            'role': 'Medical Director',
-            'bio': 'Board-certified dermatologist with over 15 years of experience in skin cancer detection and treatment.',
-            'image': 'team/doctor1.jpg'
-        },
-        {
-            'name': 'Dr. Michael Chen',
-            'role': 'AI Research Lead',
-            'bio': 'PhD in Machine Learning with a focus on medical imaging analysis and deep learning applications in healthcare.',
-            'image': 'team/researcher.jpg'
-        },
-        {
-            'name': 'Dr. Emily Rodriguez',
-            'role': 'Clinical Advisor',
-            'bio': 'Oncology specialist with expertise in melanoma treatment and early detection protocols.',
-            'image': 'team/doctor2.jpg'
-        }
-    ]
-    
-    # Research papers and publications
-    publications = [
-        {
-            'title': 'Deep Learning for Automated Detection of Melanoma in Dermoscopic Images',
-            'journal': 'Journal of Medical Imaging',
-            'year': 2023,
-            'url': '#'
-        },
-        {
-            'title': 'Comparison of Machine Learning Algorithms for Skin Lesion Classification',
-            'journal': 'JAMA Dermatology',
-            'year': 2022,
-            'url': '#'
-        },
-        {
-            'title': 'Improving Early Detection of Skin Cancer through AI-Assisted Diagnosis',
-            'journal': 'Nature Medicine',
-            'year': 2021,
-            'url': '#'
-        }
-    ]
-    
-    return render_template('about.html', team_members=team_members, publications=publications)
+    return _static_response('about.html', team_members=_TEAM_MEMBERS, publications=_PUBLICATIONS)
 
-@main_bp.route('/contact', methods=['GET', 'POST'])
+@main_bp.route('/contact', methods=['GET'])
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def contact():
-    """Handle the contact page and form submission."""
-    if request.method == 'POST':
-        # Get form data
-        name = request.form.get('name')
-        email = request.form.get('email')
-        subject = request.form.get('subject')
-        message = request.form.get('message')
-        
-        # Validate form data
-        errors = validate_contact_form(name, email, subject, message)
-        
-        if errors:
-            for error in errors:
-                flash(error, 'error')
-            return render_template('contact.html', 
-                                  name=name, 
-                                  email=email, 
-                                  subject=subject, 
-                                  message=message)
-        
-        # Send email
-        try:
-            send_contact_email(name, email, subject, message)
-            flash('Your message has been sent. We will get back to you soon!', 'success')
-            return redirect(url_for('main.contact'))
-        except Exception as e:
-            current_app.logger.error(f"Error sending email: {str(e)}")
-            flash('There was a problem sending your message. Please try again later.', 'error')
-            
+    """Render the contact page."""
     return render_template('contact.html')
 
+@main_bp.route('/contact', methods=['POST'], endpoint='contact_submit')
+def contact_submit():
+    """Handle the contact form submission."""
+    global _contact_url
+    # Get form data; the same dict re-fills the form if it is rejected
+    form = {
+        'name': request.form.get('name'),
+        'email': request.form.get('email'),
+        'subject': request.form.get('subject'),
+        'message': request.form.get('message')
+    }
+    name, email, subject, message = form.values()
+    
+    # Reject oversized fields before any validation work
+    if (len(name or '') > MAX_NAME_LENGTH or len(email or '') > MAX_EMAIL_LENGTH
+            or len(subject or '') > MAX_SUBJECT_LENGTH or len(message or '') > MAX_MESSAGE_LENGTH):
+        logger.info("Rejected oversized contact form submission from %s", request.remote_addr)
+        flash(f'Please keep your name and subject to at most {MAX_NAME_LENGTH} characters, '
+              f'your email address to at most {MAX_EMAIL_LENGTH} characters '
+              f'and your message to at most {MAX_MESSAGE_LENGTH} characters.', 'error')
+        return render_template('contact.html', **form)
+    
+    # Validate form data
+    errors = validate_contact_form(name, email, subject, message)
+    
+    if errors:
+        # One flash for all errors keeps it to a single session write
+        flash(' '.join(errors), 'error')
+        return render_template('contact.html', **form)
+    
+    # Send email in the background; failures are retried there
+    send_contact_email_task(name, email, subject, message)
+    flash('Your message has been sent. We will get back to you soon!', 'success')
+    if _contact_url is None:
+        _contact_url = url_for('main.contact')
+    return redirect(_contact_url, code=303)
+
 @main_bp.route('/find-doctor')
+@cache.cached(timeout=86400, unless=has_pending_flashes)
 def find_doctor():
     """Render the find a doctor page."""
-    google_maps_api_key = current_app.config['GOOGLE_MAPS_API_KEY']
-    return render_template('find_doctor.html', google_maps_api_key=google_maps_api_key)
+    return _static_response('find_doctor.html', google_maps_api_key=_google_maps_api_key)
 
 @main_bp.route('/privacy-policy')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def privacy_policy():
     """Render the privacy policy page."""
-    return render_template('privacy_policy.html')
+    return _static_response('privacy_policy.html')
 
 @main_bp.route('/terms-of-service')
+@cache.cached(timeout=3600, unless=has_pending_flashes)
 def terms_of_service():
     """Render the terms of service page."""
-    return render_template('terms_of_service.html')
\ No newline at end of file
+    return _static_response('terms_of_service.html')
+
+def _render_static(template_name):
+    """
+    Render a cached template with the standard template context.
+    
+    This skips Flask's per-call template lookup, and with it the
+    before_render_template and template_rendered signals.
+    """
+    template = _static_templates.get(template_name)
+    if template is None:
+        # While templates auto-reload, go through the normal lookup so edits show up
+        jinja_env = current_app.jinja_env
+        if jinja_env.auto_reload:
+            return render_template(template_name)
+        template = _static_templates[template_name] = jinja_env.get_template(template_name)
+    
+    context = {}
+    current_app.update_template_context(context)
+    return template.render(context)
+
+def _static_response(template_name, **context):
+    """Render a static page into a response that browsers and shared caches may reuse."""
+    # A page showing flash messages is specific to one visitor; check before
+    # rendering, since rendering consumes them
+    personal = has_pending_flashes()
+    
+    if context:
+        response = make_response(render_template(template_name, **context))
+    else:
+        response = make_response(_render_static(template_name))
+    
+    if personal:
+        response.cache_control.private = True
+        response.cache_control.no_store = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = STATIC_PAGE_MAX_AGE
+    return response
@@ -0,0 +1,48 @@
+# tasks.py
+import logging
+import smtplib
+import time
+from flask import current_app
+from utils.email_service import send_contact_email
+
+logger = logging.getLogger(__name__)
+
+# Retry settings for background email delivery
+EMAIL_MAX_RETRIES = 5
+EMAIL_RETRY_BACKOFF = 2  # seconds, doubled after each failed attempt
+
+def send_contact_email_task(name, email, subject, message):
+    """Queue a contact email for background delivery and return its Future."""
+    app = current_app._get_current_object()
+    return app.extensions['email_pool'].submit(_deliver_contact_email, app, name, email, subject, message)
+
+def _deliver_contact_email(app, name, email, subject, message):
+    """Send a contact email, retrying transient failures with exponential backoff."""
+    with app.app_context():
+        for attempt in range(EMAIL_MAX_RETRIES + 1):
+            try:
+                return send_contact_email(name, email, subject, message)
+            except Exception as e:
+                if not _is_transient(e):
+                    logger.error("Could not send contact email from %s: %s", email, e)
+                    return None
+                if attempt == EMAIL_MAX_RETRIES:
+                    logger.error("Giving up sending contact email from %s: %s", email, e)
+                    return None
+                
+                delay = EMAIL_RETRY_BACKOFF * 2 ** attempt
+                logger.warning("Sending contact email failed (attempt %d), retrying in %ds: %s", attempt + 1, delay, e)
+                time.sleep(delay)
+
+def _is_transient(error):
+    """Return True for email errors worth retrying: dropped or refused connections and 4xx SMTP replies."""
+    if isinstance(error, (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError)):
+        return True
+    if isinstance(error, smtplib.SMTPResponseException):
+        return 400 <= error.smtp_code < 500
+    
+    # Other SMTP errors (refused recipients, ...) are permanent; they subclass
+    # OSError, so rule them out before treating socket errors as transient
+    if isinstance(error, smtplib.SMTPException):
+        return False
+    return isinstance(error, OSError)
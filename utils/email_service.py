@@ -0,0 +1,23 @@
+# utils/email_service.py
+import smtplib
+from email.message import EmailMessage
+from flask import current_app
+
+def send_contact_email(name, email, subject, message):
+    """Send a contact form submission to the site's contact address over SMTP."""
+    config = current_app.config
+    
+    # Build the message; replies go straight to the person who wrote in
+    msg = EmailMessage()
+    msg['Subject'] = f"[Contact] {subject}"
+    msg['From'] = config['MAIL_DEFAULT_SENDER']
+    msg['To'] = config['CONTACT_EMAIL']
+    msg['Reply-To'] = email
+    msg.set_content(f"Name: {name}\nEmail: {email}\n\n{message}")
+    
+    with smtplib.SMTP(config['MAIL_SERVER'], config['MAIL_PORT'], timeout=30) as server:
+        if config['MAIL_USE_TLS']:
+            server.starttls()
+        if config['MAIL_USERNAME']:
+            server.login(config['MAIL_USERNAME'], config['MAIL_PASSWORD'])
+        server.send_message(msg)
@@ -0,0 +1,45 @@
+# utils/helpers.py
+import hashlib
+import mmap
+import os
+import re
+from config import Config
+
+# Matches filenames with an allowed extension, capturing the extension
+_EXT_RE = re.compile(
+    r'.+\.(%s)$' % '|'.join(re.escape(ext) for ext in sorted(Config.ALLOWED_EXTENSIONS)),
+    re.IGNORECASE
+)
+
+# Extensions stored under a canonical spelling
+_CANONICAL_EXTENSIONS = {'jpeg': 'jpg'}
+
+def allowed_file(filename):
+    """Return the normalized extension (e.g. '.jpg') if the filename's extension is allowed, or None."""
+    match = _EXT_RE.match(filename)
+    if match is None:
+        return None
+    ext = match.group(1).lower()
+    return '.' + _CANONICAL_EXTENSIONS.get(ext, ext)
+
+def file_hash(file_path):
+    """Return a hex digest of the file's contents, used as a cache key."""
+    with open(file_path, 'rb') as f:
+        # Hash straight from the page cache instead of copying the file into a bytes object
+        if os.fstat(f.fileno()).st_size == 0:
+            return hashlib.blake2b(b'', digest_size=16).hexdigest()
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return hashlib.blake2b(mapped, digest_size=16).hexdigest()
+
+# Leading bytes of the image formats the model accepts
+IMAGE_SIGNATURES = {
+    'jpeg': b'\xff\xd8\xff',
+    'png': b'\x89PNG\r\n\x1a\n'
+}
+
+def detect_image_type(header):
+    """Return 'jpeg' or 'png' from a file's leading bytes, or None if neither."""
+    for image_type, signature in IMAGE_SIGNATURES.items():
+        if header.startswith(signature):
+            return image_type
+    return None
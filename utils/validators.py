@@ -0,0 +1,38 @@
+# utils/validators.py
+import re
+
+# Longest address allowed by RFC 5321; checked before any regex runs
+MAX_EMAIL_LENGTH = 254
+
+# Email validation in two linear-time passes: the overall local@domain.tld shape,
+# then the allowed characters. Neither pattern can backtrack catastrophically
+_EMAIL_STRUCT = re.compile(r'[^@\s]+@[^@\s]+\.[^@\s]+')
+_EMAIL_CHARS = re.compile(r'[A-Za-z0-9._%+\-@]+')
+
+def is_valid_email(email):
+    """Return True if the string looks like a deliverable email address."""
+    return (
+        len(email) <= MAX_EMAIL_LENGTH
+        and _EMAIL_STRUCT.fullmatch(email) is not None
+        and _EMAIL_CHARS.fullmatch(email) is not None
+    )
+
+def validate_contact_form(name, email, subject, message):
+    """Validate the contact form fields and return a list of error messages (empty if valid)."""
+    errors = []
+    
+    if not name or not name.strip():
+        errors.append('Please enter your name.')
+    
+    if not email or not email.strip():
+        errors.append('Please enter your email address.')
+    elif not is_valid_email(email.strip()):
+        errors.append('Please enter a valid email address.')
+    
+    if not subject or not subject.strip():
+        errors.append('Please enter a subject.')
+    
+    if not message or not message.strip():
+        errors.append('Please enter a message.')
+    
+    return errors